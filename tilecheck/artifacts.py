@@ -0,0 +1,120 @@
+import json
+import numpy as np
+from propagation import PropagationRegistry
+
+# bumped whenever the layout of an artifact changes
+ARTIFACT_FORMAT = 1
+
+
+def saveArtifact(path, kind, **arrays):
+    """
+    Method saveArtifact stores arrays as a .npz file, tagged with the artifact format and kind
+    :param path: path of the file to be written
+    :param kind: kind of artifact, eg 'closure', checked when it is loaded
+    :param arrays: arrays to be stored, by name
+    """
+    with open(path, 'wb') as f:
+        np.savez(f, format=np.int32(ARTIFACT_FORMAT), kind=np.array(kind), **arrays)
+
+
+def loadArtifact(path, kind):
+    """
+    :param path: path of a file written by saveArtifact
+    :param kind: kind of artifact expected
+    :return: dictionary mapping names to the stored arrays
+    """
+    with np.load(path) as data:
+        _checkHeader(path, kind, int(data['format']) if 'format' in data else None,
+                     str(data['kind']) if 'kind' in data else None)
+        return {name: data[name] for name in data.files if name not in ('format', 'kind')}
+
+
+def saveJsonArtifact(path, kind, obj):
+    """
+    Method saveJsonArtifact stores a dictionary as a .json file, tagged with the artifact format and kind
+    :param path: path of the file to be written
+    :param kind: kind of artifact, checked when it is loaded
+    :param obj: JSON serializable dictionary
+    """
+    with open(path, 'w') as f:
+        json.dump({'format': ARTIFACT_FORMAT, 'kind': kind, **obj}, f, indent=1)
+
+
+def loadJsonArtifact(path, kind):
+    """
+    :param path: path of a file written by saveJsonArtifact
+    :param kind: kind of artifact expected
+    :return: the stored dictionary, without its format and kind
+    """
+    with open(path) as f:
+        obj = json.load(f)
+    _checkHeader(path, kind, obj.pop('format', None), obj.pop('kind', None))
+    return obj
+
+
+def _checkHeader(path, kind, artifact_format, artifact_kind):
+    """
+    Method raises ValueError if an artifact is of another format or kind than expected
+    """
+    if artifact_format != ARTIFACT_FORMAT:
+        raise ValueError(f'{path} has artifact format {artifact_format}, expected {ARTIFACT_FORMAT}; '
+                         f'rerun the stage that wrote it')
+    if artifact_kind != kind:
+        raise ValueError(f'{path} is a {artifact_kind} artifact, expected {kind}')
+
+
+def saveTileProps(path, tile_props, tile_prop_mapping, colours, width):
+    """
+    Method saveTileProps stores the result of main.getTilePropagations
+    :param path: path of the file to be written
+    :param tile_props: list of distinct tile propagations
+    :param tile_prop_mapping: dictionary mapping tiles to their propagations
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    """
+    registry = PropagationRegistry(tile_props)
+    saveArtifact(path, 'tile_props', props=registry.to_array(), size=np.int32(tile_props[0].size),
+                 colours=np.int32(colours), width=np.int32(width),
+                 tiles=np.array(list(tile_prop_mapping), dtype=str),
+                 tile_ids=np.array([registry.index(prop) for prop in tile_prop_mapping.values()], dtype=np.int32))
+
+
+def loadTileProps(path):
+    """
+    :param path: path of a file written by saveTileProps
+    :return: tile_props, tile_prop_mapping as returned by main.getTilePropagations, and the colours and width
+    """
+    data = loadArtifact(path, 'tile_props')
+    tile_props = PropagationRegistry.from_array(data['props'], int(data['size'])).props
+    tile_prop_mapping = {tile: tile_props[i] for tile, i in zip(data['tiles'].tolist(), data['tile_ids'].tolist())}
+    return tile_props, tile_prop_mapping, int(data['colours']), int(data['width'])
+
+
+def saveClosure(path, closure_props, product_table, tile_prop_mapping, colours, width):
+    """
+    Method saveClosure stores the result of main.getPropagationClosure, with the id of each tile's propagation
+    :param path: path of the file to be written
+    :param closure_props: PropagationRegistry of the closure
+    :param product_table: product table of the closure
+    :param tile_prop_mapping: dictionary mapping tiles to their propagations
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    """
+    saveArtifact(path, 'closure', props=closure_props.to_array(), size=np.int32(closure_props[0].size),
+                 product_table=np.asarray(product_table, dtype=np.int32),
+                 colours=np.int32(colours), width=np.int32(width),
+                 tiles=np.array(list(tile_prop_mapping), dtype=str),
+                 tile_ids=np.array([closure_props.index(prop) for prop in tile_prop_mapping.values()],
+                                   dtype=np.int32))
+
+
+def loadClosure(path):
+    """
+    :param path: path of a file written by saveClosure
+    :return: closure_props, product_table as returned by main.getPropagationClosure, a dictionary mapping tiles
+             to the ids of their propagations in closure_props, and the colours and width
+    """
+    data = loadArtifact(path, 'closure')
+    closure_props = PropagationRegistry.from_array(data['props'], int(data['size']))
+    tile_prop_ids = dict(zip(data['tiles'].tolist(), data['tile_ids'].tolist()))
+    return closure_props, data['product_table'], tile_prop_ids, int(data['colours']), int(data['width'])
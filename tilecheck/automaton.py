@@ -0,0 +1,195 @@
+import numpy as np
+from artifacts import saveArtifact, loadArtifact
+import instrument
+
+
+class Automaton:
+    """
+    Class Automaton stores a complete deterministic automaton as a states x alphabet int32 transition array.
+    State i moves to transitions[i, a] on reading the a-th letter of alphabet, and accepting[i] tells whether
+    state i is accepting.
+    """
+
+    def __init__(self, transitions, accepting, start, alphabet):
+        """
+        :param transitions: (states, letters) int32 array of successor states
+        :param accepting: boolean array, one entry per state
+        :param start: index of the start state
+        :param alphabet: list of letters, in the order of the columns of transitions
+        """
+        self.transitions = np.asarray(transitions, dtype=np.int32)
+        self.accepting = np.asarray(accepting, dtype=bool)
+        self.start = int(start)
+        self.alphabet = list(alphabet)
+
+    @classmethod
+    def fromProductTable(cls, product_table, final_ids, letter_ids, states=None):
+        """
+        Method builds the automaton reading words of propagations: the start state moves to the id of the first
+        letter, and the state of propagation p moves to the id of p * l on reading the letter of propagation l,
+        as given by product_table. Propagations which are not kept as states are replaced by a single sink.
+
+        :param product_table: n x n int32 product table of a closure
+        :param final_ids: ids of the propagations which are accepting
+        :param letter_ids: dictionary mapping each letter (eg tile) to the id of its propagation
+        :param states: ids of the propagations kept as states, all n propagations by default
+        :return: Automaton whose states are the kept propagations in order, then the start state and the sink
+        """
+        n = product_table.shape[0]
+        states = np.arange(n) if states is None else np.asarray(states, dtype=np.int64)
+        start, sink = len(states), len(states) + 1
+
+        # mapping propagation ids to states, with every dropped propagation going to the sink
+        state_of_id = np.full(n, sink, dtype=np.int32)
+        state_of_id[states] = np.arange(len(states), dtype=np.int32)
+
+        alphabet = list(letter_ids.keys())
+        columns = np.array([letter_ids[letter] for letter in alphabet], dtype=np.int64)
+        transitions = np.full((len(states) + 2, len(alphabet)), sink, dtype=np.int32)
+        transitions[:len(states)] = state_of_id[np.asarray(product_table)[np.ix_(states, columns)]]
+        transitions[start] = state_of_id[columns]
+
+        accepting = np.zeros(len(states) + 2, dtype=bool)
+        final_states = state_of_id[np.asarray(final_ids, dtype=np.int64)]
+        accepting[final_states[final_states != sink]] = True
+        return cls(transitions, accepting, start, alphabet)
+
+    def reachable(self):
+        """
+        :return: boolean array marking the states reachable from the start state
+        """
+        seen = np.zeros(len(self.accepting), dtype=bool)
+        seen[self.start] = True
+        frontier = np.array([self.start])
+        while len(frontier):
+            successors = np.unique(self.transitions[frontier])
+            frontier = successors[~seen[successors]]
+            seen[frontier] = True
+        return seen
+
+    def minimize(self):
+        """
+        Method minimize computes the minimal automaton accepting the same language, using Hopcroft's partition
+        refinement over the reachable states with an inverse transition index per letter.
+
+        :return: the minimal Automaton, with states numbered as by dfa's normalize()
+        """
+        with instrument.stage('minimize', states=len(self.accepting), letters=len(self.alphabet)) as counters:
+            kept = np.flatnonzero(self.reachable())
+            index = np.full(len(self.accepting), -1, dtype=np.int64)
+            index[kept] = np.arange(len(kept))
+            transitions = index[self.transitions[kept]]
+            n = transitions.shape[0]
+            # letters with the same transitions (eg tiles with the same propagation) split blocks alike
+            columns = np.unique(transitions, axis=1)
+            letters = columns.shape[1]
+
+            # inverse index: for letter a, sources[a][offsets[a][t]:offsets[a][t + 1]] are the states moving to t
+            sources, offsets = [], []
+            for a in range(letters):
+                order = np.argsort(columns[:, a], kind='stable')
+                sources.append(order)
+                offsets.append(np.searchsorted(columns[order, a], np.arange(n + 1)))
+
+            accepting = self.accepting[kept]
+            blocks = [set(np.flatnonzero(accepting).tolist()), set(np.flatnonzero(~accepting).tolist())]
+            blocks = [block for block in blocks if block]
+            block_of = np.zeros(n, dtype=np.int64)
+            for b, block in enumerate(blocks):
+                block_of[list(block)] = b
+            worklist = {min(range(len(blocks)), key=lambda b: len(blocks[b]))} if len(blocks) > 1 else set()
+
+            while worklist:
+                splitter = list(blocks[worklist.pop()])
+                for a in range(letters):
+                    # states moving into the splitter on letter a, grouped by their block
+                    predecessors = np.concatenate([sources[a][offsets[a][t]:offsets[a][t + 1]] for t in splitter])
+                    touched = {}
+                    for s in predecessors.tolist():
+                        touched.setdefault(block_of[s], set()).add(s)
+
+                    for b, inside in touched.items():
+                        if len(inside) == len(blocks[b]):
+                            continue
+                        # splitting block b, moving the smaller part to a new block. Whether or not b is waiting in
+                        # the worklist, it is enough to add the smaller part
+                        outside = blocks[b] - inside
+                        smaller, larger = (inside, outside) if len(inside) <= len(outside) else (outside, inside)
+                        blocks[b] = larger
+                        blocks.append(smaller)
+                        block_of[list(smaller)] = len(blocks) - 1
+                        worklist.add(len(blocks) - 1)
+
+            quotient = Automaton(block_of[transitions[[next(iter(block)) for block in blocks]]],
+                                 accepting[[next(iter(block)) for block in blocks]],
+                                 block_of[index[self.start]], self.alphabet)
+            counters.update(reachable=n, distinct_letters=letters, minimized=len(blocks))
+        return quotient.normalize()
+
+    def walk(self):
+        """
+        Method lists the states reachable from the start state in the order of dfa's walk(): a depth-first
+        search from the start state which pushes successors in sorted letter order.
+        :return: list of states
+        """
+        letters = [a for _, a in sorted((letter, a) for a, letter in enumerate(self.alphabet))]
+        visited = set()
+        order = []
+        stack = [self.start]
+        while stack:
+            state = stack.pop()
+            if state in visited:
+                continue
+            visited.add(state)
+            order.append(state)
+            stack.extend(self.transitions[state, letters].tolist())
+        return order
+
+    def normalize(self):
+        """
+        :return: the Automaton restricted to its reachable states, renumbered in walk() order
+        """
+        order = self.walk()
+        relabel = np.full(len(self.accepting), -1, dtype=np.int32)
+        relabel[order] = np.arange(len(order), dtype=np.int32)
+        return Automaton(relabel[self.transitions[order]], self.accepting[order], 0, self.alphabet)
+
+    def sinks(self):
+        """
+        :return: list of non-accepting states, other than the start state, which every letter maps to themselves
+        """
+        loops = (self.transitions == np.arange(len(self.accepting))[:, None]).all(axis=1)
+        return [int(s) for s in np.flatnonzero(loops & ~self.accepting) if s != self.start]
+
+    def toDict(self, drop_sink=False):
+        """
+        Method exports the automaton in the shape given by dfa.dfa2dict
+        :param drop_sink: if True, sink states and the transitions into them are left out
+        :return: dictionary mapping each state to (accepting, {letter: next state}), and the start state
+        """
+        sinks = set(self.sinks()) if drop_sink else set()
+        dfa_dict = {}
+        for state in range(len(self.accepting)):
+            if state in sinks:
+                continue
+            dfa_dict[state] = (bool(self.accepting[state]),
+                               {letter: int(self.transitions[state, a]) for a, letter in enumerate(self.alphabet)
+                                if int(self.transitions[state, a]) not in sinks})
+        return dfa_dict, self.start
+
+    def save(self, path):
+        """
+        Method stores the automaton as a versioned .npz artifact, see artifacts.saveArtifact
+        :param path: path of the file to be written
+        """
+        saveArtifact(path, 'automaton', transitions=self.transitions, accepting=self.accepting,
+                     start=np.int32(self.start), alphabet=np.array(self.alphabet, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: path of a file written by save()
+        :return: the stored Automaton
+        """
+        data = loadArtifact(path, 'automaton')
+        return cls(data['transitions'], data['accepting'], int(data['start']), data['alphabet'].tolist())
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from main import getTilePropagations, getPropagationClosure, get_predecessors
+from automaton import Automaton
+from characterize import characterize, tileVertexMap
+from tilegen import randomTiling
+from tilereader import iterTiles
+
+# version of the results format, bumped whenever its layout changes
+RESULTS_FORMAT = 1
+
+# largest regex, in letters, expanded by the characterize stage, taking about 0.1 s
+CHARACTERIZE_MAX_SIZE = 2000
+
+# synthetic cases, as (number of tiles, (smallest, largest) number of vertices of a tile). Characterization needs a
+# letter per tile propagation and its expansion grows exponentially with the size of the regex, so it is sure to run
+# only on the 'regex' case, a library small enough to characterize (about 400 terms with seed 0)
+SYNTHETIC_CASES = {
+    'regex': (6, (6, 9)),
+    'small': (100, (8, 12)),
+    'medium': (1000, (10, 20)),
+    'large': (3000, (20, 40)),
+}
+
+
+def loadCase(name, seed=0):
+    """
+    :param name: 'baseline' for tilings_2.json, or the name of a synthetic case
+    :param seed: seed of the synthetic tile generator
+    :return: dictionary mapping tile names to adjacency lists
+    """
+    if name == 'baseline':
+        return dict(iterTiles(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tilings_2.json')))
+    count, vertices = SYNTHETIC_CASES[name]
+    return randomTiling(count, vertices, seed=seed)
+
+
+def measure(stage, repeat, memory=True):
+    """
+    Method measure times repeat runs of stage, then runs it once more under tracemalloc for its peak memory
+    :param stage: function of no arguments
+    :param repeat: number of timed runs
+    :param memory: if False, the run under tracemalloc is skipped and peak_bytes is None
+    :return: dictionary of the timings and peak memory, and the result of the last run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = stage()
+        seconds.append(time.perf_counter() - start)
+    if not memory:
+        return {'seconds': seconds, 'best': min(seconds), 'peak_bytes': None}, result
+
+    tracemalloc.start()
+    try:
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds, 'best': min(seconds), 'peak_bytes': peak}, result
+
+
+def runCase(tiling, repeat=3, memory=True):
+    """
+    Method runCase benchmarks each stage of the pipeline on a tiling, feeding each stage the result of the last
+    :param tiling: dictionary mapping tile names to adjacency lists
+    :param repeat: number of timed runs of each stage
+    :param memory: whether to measure the peak memory of each stage, as in measure
+    :return: dictionary mapping each stage to its measurements, with the sizes of its results under 'counts'
+    """
+    stages = {}
+
+    stages['extract'], (tile_props, tile_prop_mapping) = measure(lambda: getTilePropagations(tiling), repeat, memory)
+    stages['extract']['counts'] = {'tiles': len(tiling), 'tile_props': len(tile_props)}
+
+    stages['closure'], (closure_props, product_table) = \
+        measure(lambda: getPropagationClosure(tile_props, 'batched'), repeat, memory)
+    stages['closure']['counts'] = {'closure': len(closure_props)}
+
+    four_chrom_props = [prop for prop in closure_props if not prop.has_fixed_point()]
+    stages['predecessors'], (vertices, edge_list, _, vertex_prop_map, _) = \
+        measure(lambda: get_predecessors(closure_props, four_chrom_props, product_table, tile_props), repeat,
+                memory)
+    stages['predecessors']['counts'] = {'four_chromatic': len(four_chrom_props), 'states': len(vertices),
+                                        'edges': len(edge_list)}
+
+    automaton = Automaton.fromProductTable(
+        product_table,
+        final_ids=[closure_props.index(prop) for prop in four_chrom_props],
+        letter_ids={tile: closure_props.index(prop) for tile, prop in tile_prop_mapping.items()})
+    stages['minimize'], minimized = measure(automaton.minimize, repeat, memory)
+    stages['minimize']['counts'] = {'states': len(automaton.accepting), 'minimized': len(minimized.accepting)}
+
+    transition_info, start_state = minimized.toDict(drop_sink=True)
+    try:
+        stages['characterize'], (_, _, terms, _, _, remaining) = measure(
+            lambda: characterize(transition_info, start_state, tileVertexMap(automaton),
+                                 max_size=CHARACTERIZE_MAX_SIZE), repeat, memory)
+        stages['characterize']['counts'] = {'terms': len(terms), 'remaining': len(remaining)}
+    except ValueError as e:    # no 4-chromatic sequences, too many tile propagations to name or too large a regex
+        stages['characterize'] = {'skipped': str(e)}
+    return stages
+
+
+def machineInfo():
+    """
+    :return: dictionary describing the machine, interpreter and commit the benchmarks ran on
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__, 'commit': commit}
+
+
+def compareResults(old, new):
+    """
+    Method prints the ratio of best times and peak memory of each stage in new to those in old
+    :param old: results loaded from an earlier run
+    :param new: results of this run
+    """
+    print(f"{'case':<10}{'stage':<14}{'time ratio':>12}{'memory ratio':>14}")
+    for case, stages in new['cases'].items():
+        for stage, result in stages.items():
+            before = old['cases'].get(case, {}).get(stage)
+            if before is None:
+                continue
+            if 'best' not in before or 'best' not in result:
+                print(f"{case:<10}{stage:<14} skipped in the {'new' if 'best' not in result else 'old'} results")
+                continue
+            time_ratio = result['best'] / before['best'] if before['best'] else float('nan')
+            memory_ratio = result['peak_bytes'] / before['peak_bytes'] \
+                if result['peak_bytes'] and before['peak_bytes'] else float('nan')
+            print(f'{case:<10}{stage:<14}{time_ratio:>12.3f}{memory_ratio:>14.3f}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the pipeline')
+    parser.add_argument('--cases', nargs='+', default=['baseline', 'regex', 'small'],
+                        choices=['baseline'] + list(SYNTHETIC_CASES), help='cases to run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each stage')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic tile generator')
+    parser.add_argument('--output', default='benchmark_results.json', help='file the results are written to')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    parser.add_argument('--no-memory', action='store_true', help='skip the runs measuring peak memory')
+    args = parser.parse_args()
+
+    skipped = []
+    results = {'format': RESULTS_FORMAT, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed,
+               'repeat': args.repeat, 'machine': machineInfo(), 'cases': {}}
+    for case in args.cases:
+        results['cases'][case] = runCase(loadCase(case, args.seed), args.repeat, not args.no_memory)
+        for stage, result in results['cases'][case].items():
+            if 'skipped' in result:
+                print(f'{case:<10}{stage:<14} skipped: {result["skipped"]}')
+                skipped.append(f'{case}/{stage}')
+                continue
+            memory = f"{result['peak_bytes'] / 2 ** 20:>10.2f} MiB" if result['peak_bytes'] is not None else ''
+            print(f"{case:<10}{stage:<14}{result['best']:>10.4f} s{memory}", result['counts'])
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if skipped:
+        print('Warning: stages skipped, so not benchmarked:', ', '.join(skipped), file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compareResults(json.load(f), results)
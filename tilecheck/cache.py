@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+# bumped whenever the layout of cached artifacts changes
+CACHE_FORMAT = 2
+
+# modules whose source determines the cached artifacts
+PIPELINE_MODULES = ['main.py', 'propagation.py', 'closure.py', 'colouring.py', 'canonical.py', 'tilereader.py']
+
+
+def defaultCacheDir():
+    """
+    :return: directory holding cache entries, taken from TILECHECK_CACHE_DIR if set
+    """
+    return os.environ.get('TILECHECK_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'tilecheck'))
+
+
+def codeVersion():
+    """
+    :return: hex digest identifying the cache format and the source of the pipeline modules
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in PIPELINE_MODULES:
+        with open(os.path.join(directory, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cacheKey(tiling_path, colours, width=2):
+    """
+    Method computes the cache key of a run of the pipeline
+    :param tiling_path: path of the tiling json file
+    :param colours: number of colours used
+    :param width: number of vertices on each wall
+    :return: hex digest combining a hash of the tiling file contents, the colour count, the wall width and the
+             code version
+    """
+    digest = hashlib.sha256()
+    with open(tiling_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(f'colours={colours},width={width}'.encode())
+    digest.update(codeVersion().encode())
+    return digest.hexdigest()[:32]
+
+
+class PipelineCache:
+    """
+    Class PipelineCache stores the artifacts of the pipeline for a tiling file in a directory of its own, one .npy
+    file per array and one .json file per metadata object. The artifacts of a stage of the pipeline are written
+    with saveStage, which writes a marker listing them once they are all in place, so a run interrupted part way
+    through a stage leaves it incomplete rather than half present. Arrays are memory mapped when loaded, so only
+    the parts which are used are read from disk. Entries for the same tiling file with a different key (because the
+    file, colour count, wall width or code changed) are evicted on creation, as are the least recently used entries
+    beyond max_entries.
+    """
+
+    def __init__(self, tiling_path, colours=3, width=2, cache_dir=None, max_entries=16):
+        """
+        :param tiling_path: path of the tiling json file
+        :param colours: number of colours used
+        :param width: number of vertices on each wall
+        :param cache_dir: directory holding cache entries, defaults to defaultCacheDir()
+        :param max_entries: maximum number of entries kept in cache_dir
+        """
+        self.cache_dir = cache_dir or defaultCacheDir()
+        self.key = cacheKey(tiling_path, colours, width)
+        self.path = os.path.join(self.cache_dir, self.key)
+        self.source = os.path.abspath(tiling_path)
+        self.colours = colours
+        self.width = width
+
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(os.path.join(self.path, 'entry.json')):
+            self.saveJson('entry', {'source': self.source, 'colours': colours, 'width': width,
+                                    'created': time.time()})
+        os.utime(self.path)     # marking the entry as recently used
+        self.evict(max_entries)
+
+    def _file(self, name, extension):
+        return os.path.join(self.path, name + extension)
+
+    def _write(self, path, write):
+        # writing to a temporary file first so readers never see a partially written artifact
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, name):
+        """
+        :param name: name of the cached array
+        :return: the array, memory mapped read-only
+        """
+        return np.load(self._file(name, '.npy'), mmap_mode='r')
+
+    def save(self, name, array):
+        """
+        :param name: name of the array
+        :param array: numpy array to be cached
+        """
+        self._write(self._file(name, '.npy'), lambda f: np.save(f, np.asarray(array)))
+
+    def loadJson(self, name):
+        """
+        :param name: name of the cached metadata object
+        :return: the object as loaded from json
+        """
+        with open(self._file(name, '.json')) as f:
+            return json.load(f)
+
+    def saveJson(self, name, obj):
+        """
+        :param name: name of the metadata object
+        :param obj: json serialisable object to be cached
+        """
+        self._write(self._file(name, '.json'), lambda f: f.write(json.dumps(obj).encode()))
+
+    def saveStage(self, stage, arrays=None, objects=None):
+        """
+        Method saveStage stores the artifacts of a stage of the pipeline, then a marker listing them
+        :param stage: name of the stage
+        :param arrays: dictionary mapping names to numpy arrays to be cached
+        :param objects: dictionary mapping names to json serialisable objects to be cached
+        """
+        arrays, objects = arrays or {}, objects or {}
+        for name, array in arrays.items():
+            self.save(name, array)
+        for name, obj in objects.items():
+            self.saveJson(name, obj)
+        self.saveJson(stage + '.complete', {'arrays': list(arrays), 'objects': list(objects)})
+
+    def hasStage(self, stage):
+        """
+        Method hasStage checks that the marker of a stage and every artifact it lists are present. An incomplete
+        stage is discarded, so that it is recomputed and stored again.
+        :param stage: name of the stage
+        :return: True if the stage is complete
+        """
+        try:
+            manifest = self.loadJson(stage + '.complete')
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is not None and all(os.path.exists(self._file(name, '.npy')) for name in manifest['arrays']) \
+                and all(os.path.exists(self._file(name, '.json')) for name in manifest['objects']):
+            return True
+
+        if manifest is not None:
+            for name in manifest['arrays']:
+                self._remove(self._file(name, '.npy'))
+            for name in manifest['objects']:
+                self._remove(self._file(name, '.json'))
+        self._remove(self._file(stage + '.complete', '.json'))
+        return False
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_entries):
+        """
+        Method removes stale entries of the same tiling file, colour count and wall width, and the least recently used
+        entries so that at most max_entries remain.
+        :param max_entries: maximum number of entries kept in the cache directory
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, key)
+            if key == self.key or not os.path.isdir(path):
+                continue
+            try:
+                with open(os.path.join(path, 'entry.json')) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = {}
+            if (entry.get('source'), entry.get('colours'), entry.get('width')) == \
+                    (self.source, self.colours, self.width):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                entries.append((os.path.getmtime(path), path))
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) + 1 - max_entries)]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,256 @@
+import hashlib
+
+# search nodes canonicalForm visits before giving up, after which a tile is searched for colourings directly
+CANONICAL_BUDGET = 1000
+
+
+def _refine(colours, neighbours):
+    """
+    Method refines a colouring of the vertices until every vertex of a colour class has the same multiset of
+    neighbour colours. New colours are ranks of (colour, neighbour colours) signatures, so the result does not
+    depend on how the vertices are labelled.
+
+    :param colours: list of integer colours, one per vertex
+    :param neighbours: list of neighbour indices for each vertex
+    :return: the refined list of colours
+    """
+    cells = len(set(colours))
+    while True:
+        signatures = [(colours[v], tuple(sorted(colours[u] for u in neighbours[v]))) for v in range(len(colours))]
+        ranks = {signature: i for i, signature in enumerate(sorted(set(signatures)))}
+        colours = [ranks[signature] for signature in signatures]
+        if len(ranks) == cells:
+            return colours
+        cells = len(ranks)
+
+
+def _encode(colours, vertices, neighbours, fixed):
+    """
+    Method relabels the graph with fixed vertices keeping their labels and the rest numbered in order of colour
+    :return: tuple of number of vertices and sorted edge list of the relabelled graph, and the list of new labels
+    """
+    order = sorted((v for v in range(len(vertices)) if vertices[v] not in fixed), key=lambda v: colours[v])
+    labels = {v: vertices[v] for v in range(len(vertices)) if vertices[v] in fixed}
+    labels.update((v, len(fixed) + 1 + i) for i, v in enumerate(order))
+    edges = sorted({(min(labels[v], labels[u]), max(labels[v], labels[u]))
+                    for v in range(len(vertices)) for u in neighbours[v]})
+    return (len(vertices), tuple(edges)), [labels[v] for v in range(len(vertices))]
+
+
+def _twinTranspositions(vertices, neighbours, fixed):
+    """
+    Method finds automorphisms of a graph swapping twins, ie vertices with the same neighbours other than each other
+    :return: list of permutations of the vertex indices, exchanging consecutive twins of each class of twins
+    """
+    classes = {}
+    for v in range(len(vertices)):
+        if vertices[v] not in fixed:
+            # open twins share their neighbourhood, closed twins are adjacent and share the rest of it
+            classes.setdefault(('open', frozenset(neighbours[v])), []).append(v)
+            classes.setdefault(('closed', frozenset(neighbours[v]) | {v}), []).append(v)
+    transpositions = []
+    for twins in classes.values():
+        for u, v in zip(twins, twins[1:]):
+            permutation = list(range(len(vertices)))
+            permutation[u], permutation[v] = v, u
+            transpositions.append(permutation)
+    return transpositions
+
+
+def _orbitRoots(automorphisms, prefix, n):
+    """
+    :return: list giving a representative of the orbit of each vertex under the group generated by the
+             automorphisms which fix every vertex of prefix
+    """
+    roots = list(range(n))
+
+    def find(v):
+        while roots[v] != v:
+            roots[v] = roots[roots[v]]
+            v = roots[v]
+        return v
+
+    for permutation in automorphisms:
+        if all(permutation[v] == v for v in prefix):
+            for v, image in enumerate(permutation):
+                roots[find(v)] = find(image)
+    return [find(v) for v in range(n)]
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def canonicalForm(tile, width=2, budget=CANONICAL_BUDGET):
+    """
+    Method canonicalForm computes a canonical form of a tile with its wall vertices fixed, so two tiles have the
+    same canonical form exactly when they are isomorphic through a map fixing vertices 1, ..., 2 * width. The
+    remaining vertices are labelled by colour refinement, branching on the vertices of the first class which
+    refinement does not split and keeping the smallest encoding. Branches are pruned with the automorphisms known
+    so far, as a branch maps onto any other branch in its orbit: the transpositions of twin vertices, and the
+    automorphisms found between leaves with the same encoding.
+
+    :param tile: adjacency list of the tile
+    :param width: number of vertices on each wall
+    :param budget: number of search nodes visited before giving up
+    :return: hashable canonical form of the tile, or None if the search needs more than budget nodes
+    """
+    fixed = set(range(1, 2 * width + 1))
+    vertices = list(tile.keys())
+    index = {v: i for i, v in enumerate(vertices)}
+    neighbours = [[index[u] for u in tile[v]] for v in vertices]
+    n = len(vertices)
+
+    automorphisms = _twinTranspositions(vertices, neighbours, fixed)
+    leaves = {}     # encodings found, with the labelling giving each of them first
+    nodes = 0
+
+    def search(colours, prefix):
+        nonlocal nodes
+        nodes += 1
+        if nodes > budget:
+            raise _BudgetExceeded()
+
+        colours = _refine(colours, neighbours)
+        cells = {}
+        for v, colour in enumerate(colours):
+            cells.setdefault(colour, []).append(v)
+        split = min((colour for colour, cell in cells.items() if len(cell) > 1), default=None)
+
+        if split is None:
+            encoding, labels = _encode(colours, vertices, neighbours, fixed)
+            if encoding in leaves:
+                # both labellings give the same graph, so mapping one onto the other is an automorphism
+                position = {label: v for v, label in enumerate(leaves[encoding])}
+                automorphisms.append([position[label] for label in labels])
+            else:
+                leaves[encoding] = labels
+            return
+
+        # individualising each vertex of the class, giving it a colour just below the rest of its class, skipping
+        # vertices in the orbit of one already individualised
+        explored = set()
+        for v in cells[split]:
+            roots = _orbitRoots(automorphisms, prefix, n)
+            if roots[v] in {roots[u] for u in explored}:
+                continue
+            explored.add(v)
+            individualised = [2 * colour for colour in colours]
+            individualised[v] = 2 * split - 1
+            search(individualised, prefix + [v])
+
+    # each wall vertex starts with a colour of its own, every other vertex with colour 0
+    try:
+        search([v if v in fixed else 0 for v in vertices], [])
+    except _BudgetExceeded:
+        return None
+    return min(leaves)
+
+
+def wallSymmetries(width=2):
+    """
+    Method lists the reflections of a tile which map walls onto walls, as relabellings of the wall vertices.
+    'flip' reflects the tile top to bottom, reversing each wall, and 'swap' reflects it left to right,
+    exchanging the walls.
+
+    :param width: number of vertices on each wall
+    :return: dictionary mapping each symmetry name to a dictionary relabelling the wall vertices
+    """
+    walls = list(range(1, 2 * width + 1))
+    flip = {v: width + 1 - v if v <= width else 3 * width + 1 - v for v in walls}
+    swap = {v: 2 * width + 1 - v for v in walls}
+    return {'identity': {v: v for v in walls}, 'flip': flip, 'swap': swap,
+            'flip_swap': {v: swap[flip[v]] for v in walls}}
+
+
+def relabelTile(tile, relabelling):
+    """
+    :param tile: adjacency list of a tile
+    :param relabelling: dictionary mapping some vertices to new labels, the rest keeping theirs
+    :return: adjacency list of the relabelled tile
+    """
+    def label(v):
+        return relabelling.get(v, v)
+    return {label(v): [label(u) for u in adjacent] for v, adjacent in tile.items()}
+
+
+def canonicalTile(tile, width=2):
+    """
+    Method canonicalTile finds the smallest canonical form of tile over its wall symmetries, so that tiles which
+    are isomorphic up to reflection share a canonical form.
+
+    :param tile: adjacency list of the tile
+    :param width: number of vertices on each wall
+    :return: the canonical form, and the name of the symmetry taking tile to the tile it encodes. The form is None
+             (with the identity symmetry) if canonicalForm gives up on some symmetry of the tile
+    """
+    forms = [(canonicalForm(relabelTile(tile, relabelling), width), name)
+             for name, relabelling in wallSymmetries(width).items()]
+    if any(form is None for form, _ in forms):
+        return None, 'identity'
+    return min(forms)
+
+
+def tileInvariant(tile, width=2):
+    """
+    Method tileInvariant gives a cheap invariant of a tile, equal for tiles with the same canonical form: one round
+    of colour refinement from the degrees, with each wall vertex also coloured by its orbit under the wall
+    symmetries. Tiles with different invariants cannot share a canonical form, so canonicalKey only needs to be run
+    on tiles whose invariant has been seen before.
+
+    :param tile: adjacency list of the tile
+    :param width: number of vertices on each wall
+    :return: 16 byte digest of the invariant
+    """
+    orbits = {}
+    for relabelling in wallSymmetries(width).values():
+        for v, image in relabelling.items():
+            orbits[v] = min(orbits.get(v, v), image)
+    colours = {v: (orbits.get(v, 0), len(adjacent)) for v, adjacent in tile.items()}
+    signatures = sorted((colours[v], tuple(sorted(colours[u] for u in adjacent))) for v, adjacent in tile.items())
+    return hashlib.blake2b(repr(signatures).encode(), digest_size=16).digest()
+
+
+def canonicalKey(tile, width=2):
+    """
+    Method canonicalKey gives a short key for the canonical form of a tile, so that a memo of canonical forms does
+    not hold their edge lists
+    :param tile: adjacency list of the tile
+    :param width: number of vertices on each wall
+    :return: 16 byte digest of the canonical form as given by canonicalTile (or None if it gave up), and the name
+             of the symmetry taking tile to the tile it encodes
+    """
+    form, symmetry = canonicalTile(tile, width)
+    if form is None:
+        return None, symmetry
+    return hashlib.blake2b(repr(form).encode(), digest_size=16).digest(), symmetry
+
+
+def transformProp(prop, symmetry, colours=3, width=2):
+    """
+    Method transformProp gives the propagation of a reflected tile from that of the tile. Reflecting top to
+    bottom reverses every wall colouring, permuting the states, while reflecting left to right exchanges inputs
+    with (reversed) outputs, transposing the matrix. All symmetries are their own inverses.
+
+    :param prop: Propagation of a tile
+    :param symmetry: name of a symmetry, as in wallSymmetries
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    :return: the Propagation of the reflected tile
+    """
+    if symmetry in ('flip', 'flip_swap'):
+        # reversing the base k digits of every state
+        reversal = []
+        for state in range(colours ** width):
+            digits = []
+            for _ in range(width):
+                digits.append(state % colours)
+                state //= colours
+            reversed_state = 0
+            for digit in digits:
+                reversed_state = colours * reversed_state + digit
+            reversal.append(reversed_state)
+        prop = prop.permute(reversal)
+    if symmetry in ('swap', 'flip_swap'):
+        prop = prop.transpose()
+    return prop
@@ -0,0 +1,224 @@
+import string
+import sys
+from regexast import Letter, Concat, EPSILON, concat, choice, star, size, termToString
+
+# letters reserved for the markers x (an even amount of Vis) and y (the $ symbol)
+RESERVED_LETTERS = 'xy'
+
+# tiles whose propagation is that of Vi, written g by the characterization (where f stood for AIVL)
+VI_TILES = ['VIAL', 'AIVL']
+
+# numbering of the cases of the characterization, as matched by regexformat.matchCases
+CASE_NUMBERS = ['i', 'ii', 'iii', 'iv', 'v', 'vi']
+
+
+def letterMap(tile_vertex_map, preferred=None):
+    """
+    Method letterMap gives each tile a single letter, tiles with the same propagation sharing their letter (as f
+    and g did in the hand-written characterization). A preferred letter goes to the propagation of the first of
+    its tiles present, so it is kept as long as any of them is. Other letters are handed out in order, skipping x
+    and y and the preferred letters, which are never given to other tiles even if their preferred tiles are missing.
+
+    :param tile_vertex_map: dictionary mapping tiles to the vertex (or any key) of their propagation
+    :param preferred: dictionary mapping some tiles to the letter they should get, eg {'VIAL': 'g', 'AIVL': 'g'}
+    :return: dictionary mapping each tile to its letter
+    """
+    preferred = preferred or {}
+    vertex_letters = {}
+    for tile, letter in preferred.items():
+        if tile in tile_vertex_map and letter not in vertex_letters.values():
+            vertex_letters.setdefault(tile_vertex_map[tile], letter)
+    free = (letter for letter in string.ascii_lowercase + string.ascii_uppercase
+            if letter not in RESERVED_LETTERS and letter not in preferred.values())
+    for vertex in tile_vertex_map.values():
+        if vertex not in vertex_letters:
+            try:
+                vertex_letters[vertex] = next(free)
+            except StopIteration:
+                raise ValueError('Too many distinct tile propagations to name with single letters') from None
+    return {tile: vertex_letters[vertex] for tile, vertex in tile_vertex_map.items()}
+
+
+def _weight(state, edges, incoming, size):
+    """
+    :param size: function giving the number of letters in a label
+    :return: the size added to the expression by eliminating state, as measured by the number of letters
+    """
+    ins = [(p, label) for p, label in incoming[state].items() if p != state]
+    outs = [(q, label) for q, label in edges[state].items() if q != state]
+    loop = size(edges[state][state]) if state in edges[state] else 0
+    return (sum(size(label) for _, label in ins) * (len(outs) - 1)
+            + sum(size(label) for _, label in outs) * (len(ins) - 1)
+            + loop * (len(ins) * len(outs) - 1))
+
+
+def eliminationRegex(transition_info, start_state, tile_letters, marker='g', max_size=None):
+    """
+    Method eliminationRegex derives a regular expression for the language of a DFA by state elimination. A new
+    start and a new final state are joined to the automaton by empty words, then the other states are eliminated
+    one at a time, always choosing the state whose elimination adds fewest letters, until a single edge is left.
+    Stars of the form (gg)*, for g the given marker letter, are written as x. Every edge of a trimmed automaton
+    ends up in the expression, so elimination gives up once an edge is labelled by more than max_size letters.
+
+    :param transition_info: dictionary mapping each state to (accepting, {tile: next state}), as given by
+                            Automaton.toDict or dfa.dfa2dict
+    :param start_state: the start state of the DFA
+    :param tile_letters: dictionary mapping each tile to its letter, as returned by letterMap
+    :param marker: letter whose even powers are written as x, or None to never write x
+    :param max_size: largest number of letters allowed in an edge label, unbounded if None
+    :return: root node of the regular expression, None if the language is empty
+    """
+    start, final = object(), object()
+    # edges[p][q] is the expression labelling the edge from p to q, and incoming[q][p] the same expression
+    edges = {state: {} for state in transition_info}
+    edges[start], edges[final] = {start_state: EPSILON}, {}
+    incoming = {state: {} for state in edges}
+    incoming[start_state][start] = EPSILON
+    # labels share their subexpressions, so their sizes are memoized
+    sizes = {}
+
+    def labelSize(label):
+        return size(label, sizes)
+
+    def addEdge(p, q, label):
+        label = choice(edges[p][q], label) if q in edges[p] else label
+        if max_size is not None and labelSize(label) > max_size:
+            raise ValueError(f'The regex has more than the {max_size} letters which are expanded')
+        edges[p][q] = incoming[q][p] = label
+
+    for state, (accepting, transitions) in transition_info.items():
+        # tiles with the same letter share their transitions
+        for tile, next_state in transitions.items():
+            addEdge(state, next_state, Letter(tile_letters[tile]))
+        if accepting:
+            addEdge(state, final, EPSILON)
+
+    remaining = set(transition_info)
+    while remaining:
+        state = min(remaining, key=lambda s: (_weight(s, edges, incoming, labelSize), str(s)))
+        remaining.remove(state)
+
+        loop = edges[state].pop(state, None)
+        incoming[state].pop(state, None)
+        if loop is None:
+            loop = EPSILON
+        elif isinstance(loop, Concat) and [repr(part) for part in loop.parts] == [marker, marker]:
+            loop = star(loop)
+            loop.token = 'x'
+        else:
+            loop = star(loop)
+
+        for p, into in incoming[state].items():
+            for q, out in edges[state].items():
+                addEdge(p, q, concat(into, loop, out))
+        for p in incoming[state]:
+            del edges[p][state]
+        for q in edges[state]:
+            del incoming[q][state]
+        del edges[state], incoming[state]
+
+    return edges[start].get(final)
+
+
+def tileVertexMap(automaton):
+    """
+    :param automaton: Automaton saved by main.py, whose start state takes each tile to its propagation id
+    :return: dictionary mapping each tile to the id of its propagation
+    """
+    return {tile: int(automaton.transitions[automaton.start, a]) for a, tile in enumerate(automaton.alphabet)}
+
+
+def characterize(transition_info, start_state, tile_vertex_map, preferred=None, max_size=None):
+    """
+    Method characterize derives the characterization of the language of a minimized DFA: a regular expression by
+    state elimination, expanded and simplified by regexformat, with the terms matched to the cases of the
+    characterization.
+
+    :param transition_info: dictionary mapping each state to (accepting, {tile: next state}), as given by
+                            Automaton.toDict or dfa.dfa2dict
+    :param start_state: the start state of the DFA
+    :param tile_vertex_map: dictionary mapping tiles to the vertex (or any key) of their propagation
+    :param preferred: letters some tiles should get, as in letterMap. The simplification passes of regexformat
+                      take g to be the Vi tile, so g is given to the propagation of VI_TILES by default. If no tile
+                      labelling a transition gets g, x is not written and the passes are skipped, being reported
+                      as removing None terms
+    :param max_size: largest regex, in letters, which is expanded. Expansion grows exponentially with the size of
+                     the regex, so a ValueError is raised for larger ones rather than running out of memory
+    :return: the regular expression, the map from tiles to letters, the simplified terms in order, the report of
+             simplifyTerms, and the cases and remaining terms as returned by matchCases
+    """
+    from regexformat import SIMPLIFICATION_PASSES, simplifyRegex, matchCases
+
+    # only the tiles labelling some transition are given letters
+    used = {tile for _, transitions in transition_info.values() for tile in transitions}
+    preferred = dict.fromkeys(VI_TILES, 'g') if preferred is None else preferred
+    tile_letters = letterMap({tile: vertex for tile, vertex in tile_vertex_map.items() if tile in used}, preferred)
+    has_marker = 'g' in tile_letters.values()
+    regex = eliminationRegex(transition_info, start_state, tile_letters, 'g' if has_marker else None, max_size)
+    if regex is None:
+        raise ValueError('The automaton accepts no tile sequences')
+    if has_marker:
+        terms, report = simplifyRegex(regex)
+    else:
+        terms, _ = simplifyRegex(regex, [])
+        report = [(simplification.__name__, None) for simplification in SIMPLIFICATION_PASSES]
+    terms = sorted(terms, key=termToString)
+    cases, remaining = matchCases(terms)
+    return regex, tile_letters, terms, report, cases, remaining
+
+
+def letterTiles(tile_letters):
+    """
+    :param tile_letters: dictionary mapping each tile to its letter, as returned by letterMap
+    :return: dictionary mapping each letter to the tiles sharing it, joined by '/'
+    """
+    letter_tiles = {}
+    for tile, letter in tile_letters.items():
+        letter_tiles.setdefault(letter, []).append(tile)
+    return {letter: '/'.join(tiles) for letter, tiles in letter_tiles.items()}
+
+
+def characterizationDict(regex, tile_letters, terms, report, cases, remaining):
+    """
+    Method characterizationDict gives the result of characterize in a JSON serializable form
+    :return: dictionary of the regex, letters, simplification report, terms and cases as strings of letters
+    """
+    return {'letters': letterTiles(tile_letters), 'regex': repr(regex),
+            'report': [[name, removed] for name, removed in report],
+            'terms': [termToString(term) for term in terms],
+            'cases': {number: [list(match) if isinstance(match, tuple) else match for match in case]
+                      for number, case in zip(CASE_NUMBERS, cases)},
+            'remaining': [termToString(term) for term in remaining]}
+
+
+def printCharacterization(regex, tile_letters, terms, report, cases, remaining):
+    """
+    Method prints the result of characterize, writing the cases in terms of tiles
+    """
+    letter_tiles = letterTiles(tile_letters)
+    print("Letters", letter_tiles)
+    print("Regex", regex)
+    for name, removed in report:
+        if removed is None:
+            print(name, "skipped, as no tile has letter g")
+        else:
+            print(name, "removed", removed)
+    print([termToString(term) for term in terms])
+
+    def tiles(letter):
+        return letter_tiles.get(letter, letter)
+
+    for number, case in zip(CASE_NUMBERS, cases):
+        print("Case", number)
+        print([tuple(map(tiles, match)) if isinstance(match, tuple) else tiles(match) for match in case])
+    print("Remaining")
+    print([termToString(term) for term in remaining])
+
+
+if __name__ == "__main__":
+    from automaton import Automaton
+
+    # characterizing the automaton saved by main.py
+    automaton = Automaton.load(sys.argv[1] if len(sys.argv) > 1 else "automaton.npz")
+    transition_info, start_state = automaton.minimize().toDict(drop_sink=True)
+    printCharacterization(*characterize(transition_info, start_state, tileVertexMap(automaton)))
@@ -0,0 +1,135 @@
+import numpy as np
+from automaton import Automaton
+
+
+class Classifier:
+    """
+    Class Classifier decides for batches of tile sequences whether the strip they form is 4-chromatic, using the
+    automaton compiled by main.py, whose states are the propagation ids of the closure followed by the start state.
+    Sequences are encoded as rows of letter indices, padded with a symbol which leaves every state unchanged, so a
+    whole batch is walked through the transition table one column at a time. Indices are uint8 while the alphabet
+    and padding fit, and the smallest wider unsigned type otherwise.
+    """
+
+    def __init__(self, automaton, prop_count=None):
+        """
+        :param automaton: Automaton built by Automaton.fromProductTable over the whole closure
+        :param prop_count: number of propagations in the closure, by default every state before the start state
+        """
+        self.alphabet = automaton.alphabet
+        self.letters = {letter: a for a, letter in enumerate(self.alphabet)}
+        self.pad = len(self.alphabet)
+        self.dtype = np.min_scalar_type(self.pad)
+        self.start = automaton.start
+        self.accepting = automaton.accepting
+        self.prop_count = automaton.start if prop_count is None else prop_count
+
+        # appending the padding column, which maps each state to itself
+        states = len(automaton.accepting)
+        self.table = np.empty((states, self.pad + 1), dtype=np.int32)
+        self.table[:, :self.pad] = automaton.transitions
+        self.table[:, self.pad] = np.arange(states)
+        self.table = self.table.ravel()
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: path of the automaton file saved by main.py
+        :return: Classifier for that automaton
+        """
+        return cls(Automaton.load(path))
+
+    def encode(self, sequences):
+        """
+        :param sequences: list of sequences of tile names
+        :return: (sequences, longest length) array of letter indices of type self.dtype, padded with self.pad
+        """
+        symbols = np.full((len(sequences), max(map(len, sequences), default=0)), self.pad, dtype=self.dtype)
+        for row, sequence in enumerate(sequences):
+            try:
+                symbols[row, :len(sequence)] = [self.letters[tile] for tile in sequence]
+            except KeyError as e:
+                raise ValueError(f'Unknown tile {e.args[0]} in sequence {row}') from None
+        return symbols
+
+    def classifyEncoded(self, symbols):
+        """
+        Method classifyEncoded runs the automaton on every row of symbols at once
+        :param symbols: (sequences, length) integer array of letter indices, as returned by encode
+        :return: boolean array telling whether each sequence is accepted, and int32 array of the propagation id
+                 of each sequence (-1 for the empty sequence)
+        """
+        symbols = np.asarray(symbols)
+        if symbols.dtype.kind not in 'ui':
+            raise ValueError('Letter indices must be integers')
+        if symbols.size and (symbols.min() < 0 or symbols.max() > self.pad):
+            raise ValueError('Letter index out of range')
+        width = self.pad + 1
+        states = np.full(len(symbols), self.start, dtype=np.int32)
+        for column in symbols.T:
+            states = self.table[states * width + column]
+        prop_ids = np.where(states < self.prop_count, states, -1).astype(np.int32)
+        return self.accepting[states], prop_ids
+
+    def classify(self, sequences):
+        """
+        :param sequences: list of sequences of tile names
+        :return: accepted and prop_ids as returned by classifyEncoded
+        """
+        return self.classifyEncoded(self.encode(sequences))
+
+
+def iterBatches(f, batch_size=1 << 16):
+    """
+    Method iterBatches reads tile sequences from a text file, one sequence of whitespace separated tile names per
+    line, in batches
+    :param f: file object opened in text mode
+    :param batch_size: number of sequences per batch
+    :return: generator of lists of sequences
+    """
+    batch = []
+    for line in f:
+        batch.append(line.split())
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def writeResults(f, accepted, prop_ids):
+    """
+    Method writes one line 'accept <prop id>' or 'reject <prop id>' per sequence
+    :param f: file object opened in text mode
+    """
+    f.writelines(f"{'accept' if a else 'reject'}\t{p}\n" for a, p in zip(accepted.tolist(), prop_ids.tolist()))
+
+
+def classifyFile(classifier, in_path, out_path, batch_size=1 << 16, encoded=False):
+    """
+    Method classifyFile streams tile sequences from in_path through classifier, writing results to out_path
+    :param classifier: Classifier
+    :param in_path: text file of tile sequences, or .npy file of encoded sequences if encoded is set
+    :param out_path: text file for the results, in the format of writeResults
+    :param batch_size: number of sequences classified at a time
+    :param encoded: if True, in_path holds a (sequences, length) integer array as returned by Classifier.encode
+    :return: number of sequences and number of accepted sequences
+    """
+    total = accepted_total = 0
+    with open(out_path, 'w') as out:
+        if encoded:
+            symbols = np.load(in_path, mmap_mode='r')
+            batches = (classifier.classifyEncoded(symbols[i:i + batch_size])
+                       for i in range(0, len(symbols), batch_size))
+        else:
+            f = open(in_path)
+            batches = (classifier.classify(batch) for batch in iterBatches(f, batch_size))
+        try:
+            for accepted, prop_ids in batches:
+                writeResults(out, accepted, prop_ids)
+                total += len(accepted)
+                accepted_total += int(accepted.sum())
+        finally:
+            if not encoded:
+                f.close()
+    return total, accepted_total
@@ -0,0 +1,158 @@
+import argparse
+import sys
+
+
+def extractCommand(args):
+    from artifacts import saveTileProps
+    from main import getTilePropagations
+    from tilereader import iterTiles
+
+    tile_props, tile_prop_mapping = getTilePropagations(iterTiles(args.tiling), args.colours, args.width, args.mode,
+                                                        args.processes, canonical=args.canonical,
+                                                        engine=args.engine)
+    saveTileProps(args.output, tile_props, tile_prop_mapping, args.colours, args.width)
+    print(f'{len(tile_prop_mapping)} tiles with {len(tile_props)} distinct propagations', file=sys.stderr)
+
+
+def closureCommand(args):
+    from artifacts import loadTileProps, saveClosure
+    from main import getPropagationClosure
+
+    tile_props, tile_prop_mapping, colours, width = loadTileProps(args.tile_props)
+    closure_props, product_table = getPropagationClosure(tile_props, args.mode, args.processes)
+    saveClosure(args.output, closure_props, product_table, tile_prop_mapping, colours, width)
+    print(f'{len(closure_props)} propagations in the closure', file=sys.stderr)
+
+
+def automatonCommand(args):
+    from artifacts import loadClosure
+    from automaton import Automaton
+
+    closure_props, product_table, tile_prop_ids, _, _ = loadClosure(args.closure)
+    # the 4-chromatic propagations are those taking no colouring of the wall back to itself
+    final_ids = [i for i, prop in enumerate(closure_props) if not prop.has_fixed_point()]
+    Automaton.fromProductTable(product_table, final_ids, tile_prop_ids).save(args.output)
+    print(f'{len(final_ids)} of {len(closure_props)} propagations are 4-chromatic', file=sys.stderr)
+
+
+def characterizeCommand(args):
+    from artifacts import saveJsonArtifact
+    from automaton import Automaton
+    from characterize import characterize, characterizationDict, printCharacterization, tileVertexMap
+
+    automaton = Automaton.load(args.automaton)
+    transition_info, start_state = automaton.minimize().toDict(drop_sink=True)
+    result = characterize(transition_info, start_state, tileVertexMap(automaton))
+    printCharacterization(*result)
+    if args.output:
+        saveJsonArtifact(args.output, 'characterization', characterizationDict(*result))
+
+
+def classifyCommand(args):
+    from classify import Classifier, classifyFile
+
+    classifier = Classifier.load(args.automaton)
+    total, accepted = classifyFile(classifier, args.input, args.output, args.batch_size, args.encoded)
+    print(f'{accepted} of {total} sequences are 4-chromatic', file=sys.stderr)
+
+
+def countCommand(args):
+    from automaton import Automaton
+    from counting import countAccepted, growthRate
+
+    automaton = Automaton.load(args.automaton).minimize()
+    for n, count in enumerate(countAccepted(automaton, args.max_length)):
+        print(n, count)
+    print('Growth rate', growthRate(automaton))
+
+
+def witnessCommand(args):
+    from artifacts import loadClosure
+    from witness import bidirectionalWitness, witnessWords
+
+    closure_props, product_table, tile_prop_ids, _, _ = loadClosure(args.closure)
+
+    if args.target is not None:
+        words = {args.target: bidirectionalWitness(product_table, tile_prop_ids, args.target)}
+    else:
+        prop_ids = [i for i, prop in enumerate(closure_props)
+                    if not args.four_chromatic or not prop.has_fixed_point()]
+        words = witnessWords(product_table, tile_prop_ids, prop_ids)
+    for prop_id, word in words.items():
+        print(prop_id, ' '.join(word) if word is not None else '-')
+
+
+def buildParser():
+    """
+    :return: argparse.ArgumentParser with a subcommand per stage of the pipeline
+    """
+    parser = argparse.ArgumentParser(prog='tilecheck')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract = subparsers.add_parser('extract', help='find the propagation of each tile')
+    extract.add_argument('tiling', nargs='?', default='tilings_2.json', help='tiling file')
+    extract.add_argument('-k', '--colours', type=int, default=3, help='number of colours')
+    extract.add_argument('-w', '--width', type=int, default=2, help='number of vertices on each wall')
+    extract.add_argument('-m', '--mode', default='serial', choices=['serial', 'parallel'],
+                         help='process tiles one at a time or over a process pool')
+    extract.add_argument('-p', '--processes', type=int, help='worker processes in parallel mode')
+    extract.add_argument('-e', '--engine', default='auto', choices=['auto', 'numpy', 'bitmask', 'recursive', 'check'],
+                         help="colouring engine, 'check' cross-validates the numpy and bitmask engines on every tile "
+                              "(ignoring --canonical)")
+    extract.add_argument('-c', '--canonical', action='store_true',
+                         help='search once per canonical form of the tiles, for libraries with many isomorphic tiles')
+    extract.add_argument('-o', '--output', default='tile_props.npz', help='tile propagations artifact written')
+    extract.set_defaults(run=extractCommand)
+
+    closure = subparsers.add_parser('closure', help='close the tile propagations under multiplication')
+    closure.add_argument('tile_props', nargs='?', default='tile_props.npz', help='artifact written by extract')
+    closure.add_argument('-m', '--mode', default='batched', choices=['serial', 'batched', 'parallel'],
+                         help='closure engine')
+    closure.add_argument('-p', '--processes', type=int, help='worker processes in parallel mode')
+    closure.add_argument('-o', '--output', default='closure.npz', help='closure artifact written')
+    closure.set_defaults(run=closureCommand)
+
+    automaton = subparsers.add_parser('automaton', help='compile the automaton of 4-chromatic tile sequences')
+    automaton.add_argument('closure', nargs='?', default='closure.npz', help='artifact written by closure')
+    automaton.add_argument('-o', '--output', default='automaton.npz', help='automaton artifact written')
+    automaton.set_defaults(run=automatonCommand)
+
+    characterize = subparsers.add_parser('characterize', help='derive the characterization of 4-chromatic tile '
+                                                              'sequences')
+    characterize.add_argument('-a', '--automaton', default='automaton.npz', help='artifact written by automaton')
+    characterize.add_argument('-o', '--output', help='JSON artifact the characterization is also written to')
+    characterize.set_defaults(run=characterizeCommand)
+
+    classify = subparsers.add_parser('classify', help='classify tile sequences with a compiled automaton')
+    classify.add_argument('input', help='text file with one sequence of whitespace separated tile names per line, '
+                                        'or .npy file of encoded sequences with --encoded')
+    classify.add_argument('-a', '--automaton', default='automaton.npz',
+                          help='automaton saved by main.py or the automaton command')
+    classify.add_argument('-o', '--output', default='/dev/stdout',
+                          help="file for one 'accept <prop id>' or 'reject <prop id>' line per sequence")
+    classify.add_argument('-b', '--batch-size', type=int, default=1 << 16, help='sequences classified at a time')
+    classify.add_argument('--encoded', action='store_true',
+                          help='input is an array of letter indices, as written by Classifier.encode')
+    classify.set_defaults(run=classifyCommand)
+
+    count = subparsers.add_parser('count', help='count 4-chromatic tile sequences of each length')
+    count.add_argument('max_length', type=int, help='largest sequence length counted')
+    count.add_argument('-a', '--automaton', default='automaton.npz',
+                       help='automaton saved by main.py or the automaton command')
+    count.set_defaults(run=countCommand)
+
+    witness = subparsers.add_parser('witness', help='find shortest tile sequences giving each propagation')
+    witness.add_argument('closure', nargs='?', default='closure.npz', help='artifact written by closure')
+    witness.add_argument('-t', '--target', type=int, help='id of a single propagation, found by bidirectional search')
+    witness.add_argument('--four-chromatic', action='store_true', help='only list 4-chromatic propagations')
+    witness.set_defaults(run=witnessCommand)
+    return parser
+
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
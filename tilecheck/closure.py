@@ -0,0 +1,299 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from propagation import Propagation
+import instrument
+
+
+def growProductTable(product_table, size):
+    """
+    Method enlarges product_table so that it can hold at least size x size products. New entries are -1,
+    marking products which have not been calculated yet.
+
+    :param product_table: square int32 array of propagation ids
+    :param size: number of propagations the table must be able to hold
+    :return: product_table itself if it is large enough, otherwise an enlarged copy
+    """
+    capacity = product_table.shape[0]
+    if size <= capacity:
+        return product_table
+    grown = np.full((max(size, 2 * capacity), max(size, 2 * capacity)), -1, dtype=np.int32)
+    grown[:capacity, :capacity] = product_table
+    return grown
+
+
+def reverseProductIndex(product_table, label_ids):
+    """
+    Method reverseProductIndex lists, for each propagation t, the pairs (propagation, label) whose product is t.
+    Pair k stands for propagation k // len(label_ids) multiplied on the right by label_ids[k % len(label_ids)].
+
+    :param product_table: n x n int32 product table of a closure
+    :param label_ids: array of ids of the labels (eg tile propagations)
+    :return: pairs, offsets such that pairs[offsets[t]:offsets[t + 1]] are the pairs whose product is t, and the
+             array of products of all pairs
+    """
+    n = product_table.shape[0]
+    targets = np.asarray(product_table)[:, label_ids].ravel()
+    pairs = np.argsort(targets, kind='stable')
+    offsets = np.searchsorted(targets[pairs], np.arange(n + 1))
+    return pairs, offsets, targets
+
+
+def stackPropagations(props, size):
+    """
+    Method stacks propagations into a 3-D boolean array of adjacency matrices
+    :param props: list of Propagations, all of the given size
+    :param size: number of rows (and columns) of each adjacency matrix
+    :return: (len(props), size, size) boolean array
+    """
+    nbytes = (size * size + 7) // 8
+    packed = np.frombuffer(b''.join(prop.key() for prop in props), dtype=np.uint8).reshape(-1, nbytes)
+    bits = np.unpackbits(packed, axis=1, count=size * size, bitorder='little')
+    return bits.reshape(-1, size, size).astype(bool)
+
+
+def batchedProducts(left, right):
+    """
+    Method computes every normalised product left[i] * right[j] with a single matrix multiplication, and packs
+    each resulting adjacency matrix into its canonical bytes.
+
+    :param left: (a, size, size) boolean array of adjacency matrices
+    :param right: (b, size, size) boolean array of adjacency matrices
+    :return: (a, b, nbytes) uint8 array, where [i, j] holds the canonical bytes of left[i] * right[j]
+    """
+    a, size, _ = left.shape
+    b = right.shape[0]
+    # laying out right as a size x (b * size) matrix so all products come out of one GEMM
+    wide_right = right.transpose(1, 0, 2).reshape(size, b * size).astype(np.float32)
+    counts = left.reshape(a * size, size).astype(np.float32) @ wide_right
+    products = (counts > 0).reshape(a, size, b, size).transpose(0, 2, 1, 3)
+    return np.packbits(products.reshape(a, b, size * size), axis=2, bitorder='little')
+
+
+def internProducts(closure_props, packed, size):
+    """
+    Method looks up the ids of packed products, adding newly encountered propagations to closure_props in order
+    of first occurrence so that ids match those given by multiplying the products one at a time.
+
+    :param closure_props: PropagationRegistry of the propagations found so far
+    :param packed: (m, nbytes) uint8 array of canonical bytes of products
+    :param size: number of rows (and columns) of each adjacency matrix
+    :return: int32 array of m propagation ids
+    """
+    keys = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    ids = np.empty(len(unique_keys), dtype=np.int32)
+    for k in np.argsort(first, kind='stable'):
+        ids[k], _ = closure_props.add(Propagation(int.from_bytes(unique_keys[k].tobytes(), 'little'), size))
+    return ids[inverse.ravel()]
+
+
+def batchedClosure(closure_props, product_table, closed_count=0, max_block=1 << 26):
+    """
+    Method batchedClosure computes the closure of the propagations in closure_props level by level. At each
+    level the products old * new, new * old and new * new are computed in blocks of batched matrix
+    multiplications instead of one pair at a time, and deduplicated with np.unique on packed rows. The resulting
+    ids and product table are identical to those of the pairwise loop in main.getPropagationClosure.
+
+    :param closure_props: PropagationRegistry holding the starting propagations
+    :param product_table: int32 array of at least len(closure_props) x len(closure_props) entries
+    :param closed_count: number of propagations, at the start of closure_props, whose products are already
+                         calculated in product_table
+    :param max_block: bound on the number of matrix entries computed in a single batch
+    :return: closure_props, with the closure added, and the n x n product table
+    """
+    size = closure_props[0].size
+    matrices = stackPropagations(closure_props.props, size)
+    start, end = closed_count, len(closure_props)   # the new propagations of a level have ids start..end-1
+
+    # Iterate until no new propagations are found
+    while start < end:
+        round_start = time.perf_counter()
+        product_table = growProductTable(product_table, end)
+        new = matrices[start:end]
+        new_count = end - start
+        rows = max(1, max_block // (2 * new_count * size * size))
+
+        # Calculating old * new and new * old, interleaved as they would be calculated pair by pair
+        for i in range(0, start, rows):
+            old = matrices[i:min(i + rows, start)]
+            old_new = batchedProducts(old, new)
+            new_old = batchedProducts(new, old).transpose(1, 0, 2)
+            packed = np.stack([old_new, new_old], axis=2).reshape(-1, old_new.shape[2])
+            ids = internProducts(closure_props, packed, size).reshape(len(old), new_count, 2)
+            product_table[i:i + len(old), start:end] = ids[:, :, 0]
+            product_table[start:end, i:i + len(old)] = ids[:, :, 1].T
+
+        # Finding combinations of new * new
+        for i in range(start, end, rows):
+            block = new[i - start:min(i - start + rows, new_count)]
+            packed = batchedProducts(block, new)
+            ids = internProducts(closure_props, packed.reshape(-1, packed.shape[2]), size)
+            product_table[i:i + len(block), start:end] = ids.reshape(len(block), new_count)
+
+        instrument.record('closure_round', mode='batched', frontier=new_count, old=start,
+                          products=new_count * (2 * start + new_count), new=len(closure_props) - end,
+                          seconds=round(time.perf_counter() - round_start, 6))
+
+        # Moving on to the propagations found during this level
+        matrices = np.concatenate([matrices, stackPropagations(closure_props.props[end:], size)])
+        start, end = end, len(closure_props)
+
+    n = len(closure_props)
+    return closure_props, np.ascontiguousarray(product_table[:n, :n])
+
+
+# state shared with closure worker processes, set up by _initClosureWorker
+_worker_state = {}
+
+
+def _initClosureWorker(known_shm, known_shape, table_shm, capacity, size):
+    """
+    Pool initializer which maps the shared arrays of a closure level into the worker process
+    """
+    known = np.ndarray(known_shape, dtype=np.uint8, buffer=known_shm.buf)
+    _worker_state['known_ids'] = {row.tobytes(): i for i, row in enumerate(known)}
+    _worker_state['matrices'] = np.unpackbits(known, axis=1, count=size * size,
+                                              bitorder='little').reshape(-1, size, size).astype(bool)
+    _worker_state['table'] = np.ndarray((capacity, capacity), dtype=np.int32, buffer=table_shm.buf)
+    # keeping references so the shared memory stays mapped while the worker is alive
+    _worker_state['shm'] = (known_shm, table_shm)
+
+
+def _closureTile(task):
+    """
+    Method computes a tile of a closure level in a worker process. Products which are already known are written
+    to the shared product table as their ids, while newly found products are written as -(k + 2), where k is
+    their position in the returned list.
+
+    :param task: (kind, i0, i1, start, end), where kind 'old' covers the products old * new and new * old for
+                 the old propagations i0..i1-1, and kind 'new' covers new * new for the new propagations i0..i1-1
+    :return: canonical bytes of the newly found propagations, in order of first occurrence within the tile
+    """
+    kind, i0, i1, start, end = task
+    matrices = _worker_state['matrices']
+    table = _worker_state['table']
+    new = matrices[start:end]
+
+    if kind == 'old':
+        old_new = batchedProducts(matrices[i0:i1], new)
+        new_old = batchedProducts(new, matrices[i0:i1]).transpose(1, 0, 2)
+        packed = np.stack([old_new, new_old], axis=2).reshape(-1, old_new.shape[2])
+    else:
+        packed = batchedProducts(matrices[i0:i1], new)
+        packed = packed.reshape(-1, packed.shape[2])
+
+    keys = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    codes = np.empty(len(unique_keys), dtype=np.int32)
+    found = []
+    for k in np.argsort(first, kind='stable'):
+        key = unique_keys[k].tobytes()
+        prop_id = _worker_state['known_ids'].get(key)
+        if prop_id is None:
+            prop_id = -(len(found) + 2)
+            found.append(key)
+        codes[k] = prop_id
+    ids = codes[inverse.ravel()]
+
+    if kind == 'old':
+        ids = ids.reshape(i1 - i0, end - start, 2)
+        table[i0:i1, start:end] = ids[:, :, 0]
+        table[start:end, i0:i1] = ids[:, :, 1].T
+    else:
+        table[i0:i1, start:end] = ids.reshape(i1 - i0, end - start)
+    return found
+
+
+def _resolveTile(region, lut):
+    """
+    Method replaces the -(k + 2) placeholders written by _closureTile in region with the ids in lut
+    """
+    placeholders = region <= -2
+    region[placeholders] = lut[-region[placeholders] - 2]
+
+
+def parallelClosure(closure_props, product_table, closed_count=0, processes=None, max_block=1 << 24):
+    """
+    Method parallelClosure computes the closure of the propagations in closure_props level by level like
+    batchedClosure, splitting the old * new / new * old and new * new blocks of every level into row tiles which
+    are run on a process pool. Workers write product ids straight into a shared memory product table, and the
+    propagations found in each level are merged in tile order afterwards, so ids and product table are identical
+    to those of the serial computation.
+
+    :param closure_props: PropagationRegistry holding the starting propagations
+    :param product_table: int32 array of at least len(closure_props) x len(closure_props) entries
+    :param closed_count: number of propagations, at the start of closure_props, whose products are already
+                         calculated in product_table
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param max_block: bound on the number of matrix entries computed in a single batch by a worker
+    :return: closure_props, with the closure added, and the n x n product table
+    """
+    size = closure_props[0].size
+    processes = processes or multiprocessing.cpu_count()
+    # workers inherit the shared memory mappings when forked, rather than attaching to them by name
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    capacity = max(product_table.shape[0], 1)
+    table_shm = shared_memory.SharedMemory(create=True, size=capacity * capacity * 4)
+    table = np.ndarray((capacity, capacity), dtype=np.int32, buffer=table_shm.buf)
+    table[:] = product_table[:capacity, :capacity]
+    start, end = closed_count, len(closure_props)
+
+    try:
+        # Iterate until no new propagations are found
+        while start < end:
+            round_start = time.perf_counter()
+            if end > capacity:
+                grown = growProductTable(table, end)
+                table = None
+                table_shm.close()
+                table_shm.unlink()
+                capacity = grown.shape[0]
+                table_shm = shared_memory.SharedMemory(create=True, size=capacity * capacity * 4)
+                table = np.ndarray((capacity, capacity), dtype=np.int32, buffer=table_shm.buf)
+                table[:] = grown
+
+            known = closure_props.to_array()
+            known_shm = shared_memory.SharedMemory(create=True, size=max(known.nbytes, 1))
+            np.ndarray(known.shape, dtype=np.uint8, buffer=known_shm.buf)[:] = known
+
+            # splitting the level into row tiles, a few per process to balance the load
+            new_count = end - start
+            rows = max(1, min(max_block // (2 * new_count * size * size), -(-end // (4 * processes))))
+            tasks = [('old', i, min(i + rows, start), start, end) for i in range(0, start, rows)]
+            tasks += [('new', i, min(i + rows, end), start, end) for i in range(start, end, rows)]
+
+            try:
+                with context.Pool(processes, _initClosureWorker,
+                                  (known_shm, known.shape, table_shm, capacity, size)) as pool:
+                    results = pool.map(_closureTile, tasks)
+            finally:
+                known_shm.close()
+                known_shm.unlink()
+
+            # Merging the newly found propagations deterministically, in tile order
+            for (kind, i0, i1, _, _), found in zip(tasks, results):
+                if not found:
+                    continue
+                lut = np.array([closure_props.add(Propagation(int.from_bytes(key, 'little'), size))[0]
+                                for key in found], dtype=np.int32)
+                _resolveTile(table[i0:i1, start:end], lut)
+                if kind == 'old':
+                    _resolveTile(table[start:end, i0:i1], lut)
+
+            instrument.record('closure_round', mode='parallel', frontier=new_count, old=start,
+                              products=new_count * (2 * start + new_count), new=len(closure_props) - end,
+                              tasks=len(tasks), seconds=round(time.perf_counter() - round_start, 6))
+            start, end = end, len(closure_props)
+
+        n = len(closure_props)
+        return closure_props, np.array(table[:n, :n])
+    finally:
+        table = None
+        table_shm.close()
+        table_shm.unlink()
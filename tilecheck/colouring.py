@@ -0,0 +1,200 @@
+import functools
+import itertools
+import numpy as np
+
+# bruteForceWallColourings is used for graphs with at most this many colourings, eg 10 vertices with 3 colours,
+# beyond which searching with findWallColourings is faster
+BRUTE_FORCE_MAX_COLOURINGS = 3 ** 10
+
+
+def _assign(domains, v, colour_bit, neighbours):
+    """
+    Method fixes the colour of vertex v and removes it from the domains of its neighbours (forward checking)
+    :param domains: list of colour bitmasks, one per vertex
+    :param v: index of the vertex being coloured
+    :param colour_bit: bitmask of the single colour given to v
+    :param neighbours: list of neighbour indices for each vertex
+    :return: the new list of domains, or None if some neighbour has no colours left
+    """
+    domains = domains.copy()
+    domains[v] = colour_bit
+    for u in neighbours[v]:
+        domain = domains[u]
+        if domain & colour_bit:
+            domain &= ~colour_bit
+            if not domain:
+                return None
+            domains[u] = domain
+    return domains
+
+
+def _colourBits(domain):
+    """
+    :return: list of single bit bitmasks making up domain, lowest colour first
+    """
+    bits = []
+    while domain:
+        low = domain & -domain
+        bits.append(low)
+        domain ^= low
+    return bits
+
+
+def _completable(domains, assigned, neighbours, stats=None):
+    """
+    Method checks whether the partial colouring given by domains can be extended to a proper colouring of all
+    vertices. The search is an iterative depth-first search which always colours the unassigned vertex with the
+    smallest domain next, and stops at the first complete colouring found.
+
+    :param domains: list of colour bitmasks, one per vertex, consistent with the colours of assigned vertices
+    :param assigned: bitmask of the vertices which have already been coloured
+    :param neighbours: list of neighbour indices for each vertex
+    :param stats: dictionary whose 'search_nodes' count is increased by the number of partial colourings visited
+    :return: True if a proper colouring exists, False otherwise
+    """
+    n = len(domains)
+    stack = [(domains, assigned)]
+    nodes = 0
+    while stack:
+        domains, assigned = stack.pop()
+        nodes += 1
+
+        # choosing the uncoloured vertex with fewest colours left
+        best, best_count = -1, n + 1
+        for v in range(n):
+            if not (assigned >> v) & 1:
+                count = domains[v].bit_count()
+                if count < best_count:
+                    best, best_count = v, count
+                    if count == 1:
+                        break
+
+        if best == -1:  # every vertex is coloured
+            if stats is not None:
+                stats['search_nodes'] += nodes
+            return True
+
+        for colour_bit in reversed(_colourBits(domains[best])):
+            new_domains = _assign(domains, best, colour_bit, neighbours)
+            if new_domains is not None:
+                stack.append((new_domains, assigned | (1 << best)))
+    if stats is not None:
+        stats['search_nodes'] += nodes
+    return False
+
+
+def findWallColourings(adjacency_list, precolouring, colours, walls, stats=None):
+    """
+    Method findWallColourings finds all colourings of the wall vertices which extend to a proper colouring of the
+    graph specified by the adjacency list. Each vertex keeps a bitmask of the colours still available to it.
+    The wall vertices are coloured first, and each colouring of the walls is then checked for a single completion
+    of the remaining vertices, so no colouring of the walls is found twice.
+
+    :param adjacency_list: dictionary mapping each vertex to a list of its neighbours
+    :param precolouring: dictionary mapping vertices with a fixed colour to that colour
+    :param colours: colours available
+    :param walls: wall vertices, in the order their colours are reported
+    :param stats: dictionary whose 'search_nodes' count is increased by the number of partial colourings visited,
+                  of the walls and of the remaining vertices
+    :return: set of tuples, each giving the colours of walls in a proper colouring of the graph
+    """
+    vertices = list(adjacency_list.keys())
+    index = {v: i for i, v in enumerate(vertices)}
+    neighbours = [[index[u] for u in adjacency_list[v]] for v in vertices]
+    all_colours = (1 << len(colours)) - 1
+
+    domains = [all_colours] * len(vertices)
+    assigned = 0
+    for v, colour in precolouring.items():
+        colour_bit = 1 << colours.index(colour)
+        if not domains[index[v]] & colour_bit:     # clashes with an adjacent precoloured vertex
+            return set()
+        domains = _assign(domains, index[v], colour_bit, neighbours)
+        if domains is None:
+            return set()
+        assigned |= 1 << index[v]
+
+    wall_indices = [index[v] for v in walls]
+    free_walls = [i for i in wall_indices if not (assigned >> i) & 1]
+
+    result = set()
+    # depth-first search over colourings of the uncoloured wall vertices
+    stack = [(domains, assigned, 0)]
+    while stack:
+        domains, assigned, depth = stack.pop()
+        if stats is not None:
+            stats['search_nodes'] += 1
+        if depth == len(free_walls):
+            if _completable(domains, assigned, neighbours, stats):
+                result.add(tuple(colours[domains[i].bit_length() - 1] for i in wall_indices))
+            continue
+
+        v = free_walls[depth]
+        for colour_bit in _colourBits(domains[v]):
+            new_domains = _assign(domains, v, colour_bit, neighbours)
+            if new_domains is not None:
+                stack.append((new_domains, assigned | (1 << v), depth + 1))
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _colouringTable(k, count, wall_count):
+    """
+    :return: a (count, k^count) uint8 array whose columns are all colourings of count vertices with k colours, and
+             the code of the colouring of the first wall_count vertices of each column, read in base k
+    """
+    table = np.indices((k,) * count, dtype=np.uint8).reshape(count, -1)
+    table.flags.writeable = False
+    wall_codes = (k ** np.arange(wall_count, dtype=np.int64)) @ table[:wall_count]
+    wall_codes.flags.writeable = False
+    return table, wall_codes
+
+
+def bruteForceWallColourings(adjacency_list, colours, walls, max_block=1 << 16, stats=None):
+    """
+    Method bruteForceWallColourings finds all colourings of the wall vertices which extend to a proper colouring of
+    the graph specified by the adjacency list, by enumerating all k^n colourings of its n vertices with NumPy.
+    The walls and the next vertices are the low digits of the colourings, and are enumerated once as the columns
+    of a table of at most max_block colourings, whose edges are checked with one vectorized comparison each. The
+    colourings are then enumerated a block at a time, each block fixing the colours of the other (high) vertices,
+    with an edge to a high vertex checked as a comparison of a row of the table with its colour. This is faster
+    than searching for small graphs, but the work grows as k^n whatever the graph.
+
+    :param adjacency_list: dictionary mapping each vertex to a list of its neighbours
+    :param colours: colours available
+    :param walls: wall vertices, in the order their colours are reported
+    :param max_block: bound on the number of colourings enumerated at a time
+    :param stats: dictionary whose 'colourings' count is increased by the k^n colourings enumerated
+    :return: set of tuples, each giving the colours of walls in a proper colouring of the graph, as returned by
+             findWallColourings with no precolouring
+    """
+    k = len(colours)
+    order = list(walls) + [v for v in adjacency_list if v not in walls]
+    index = {v: i for i, v in enumerate(order)}
+    edges = {(min(index[v], index[u]), max(index[v], index[u])) for v in adjacency_list for u in adjacency_list[v]}
+    low_count = len(walls)
+    while low_count < len(order) and k ** (low_count + 1) <= max_block:
+        low_count += 1
+
+    # table[j] holds the colour of vertex j in each of the k^low_count colourings of the low vertices
+    table, wall_codes = _colouringTable(k, low_count, len(walls))
+    low_proper = np.ones(table.shape[1], dtype=bool)
+    for u, v in edges:
+        if v < low_count:
+            low_proper &= table[u] != table[v]
+    cross_edges = [(v - low_count, u) for u, v in edges if u < low_count <= v]
+    high_edges = [(u - low_count, v - low_count) for u, v in edges if low_count <= u]
+
+    found = np.zeros(k ** len(walls), dtype=bool)
+    for high in itertools.product(range(k), repeat=len(order) - low_count):
+        if any(high[u] == high[v] for u, v in high_edges):
+            continue
+        proper = low_proper.copy()
+        for h, u in cross_edges:
+            proper &= table[u] != high[h]
+        found[wall_codes[proper]] = True
+
+    if stats is not None:
+        stats['colourings'] += k ** len(order)
+
+    return {tuple(colours[code // k ** j % k] for j in range(len(walls))) for code in np.flatnonzero(found).tolist()}
@@ -0,0 +1,104 @@
+import numpy as np
+
+# decimal places to which growthRate finds the growth rate
+GROWTH_DIGITS = 9
+
+
+def trimmedStates(automaton):
+    """
+    :param automaton: Automaton
+    :return: array of the states which are reachable from the start state and from which an accepting state is
+             reachable; only these states lie on paths of accepted words
+    """
+    reachable = automaton.reachable()
+    coreachable = automaton.accepting.copy()
+    while True:
+        # a state is co-reachable if some letter takes it to a co-reachable state
+        grown = coreachable | coreachable[automaton.transitions].any(axis=1)
+        if (grown == coreachable).all():
+            break
+        coreachable = grown
+    return np.flatnonzero(reachable & coreachable)
+
+
+def countMatrix(automaton, states=None):
+    """
+    Method countMatrix builds the transfer matrix of the automaton, whose (s, t) entry is the number of letters
+    taking state s to state t
+    :param automaton: Automaton
+    :param states: states to keep, all states by default
+    :return: square int64 array indexed by positions in states
+    """
+    states = np.arange(len(automaton.accepting)) if states is None else np.asarray(states)
+    position = np.full(len(automaton.accepting), -1, dtype=np.int64)
+    position[states] = np.arange(len(states))
+    targets = position[automaton.transitions[states]]
+    matrix = np.zeros((len(states), len(states)), dtype=np.int64)
+    rows = np.repeat(np.arange(len(states)), targets.shape[1])
+    kept = targets.ravel() != -1
+    np.add.at(matrix, (rows[kept], targets.ravel()[kept]), 1)
+    return matrix
+
+
+def countAccepted(automaton, max_length):
+    """
+    Method countAccepted counts the accepted words of each length n = 0, ..., max_length exactly, by rolling
+    the vector of path counts from the start state through the transfer matrix over the trimmed states
+    :param automaton: Automaton, eg the minimized automaton of main.py
+    :param max_length: largest word length counted
+    :return: list of max_length + 1 integers, the n-th being the number of accepted words of length n
+    """
+    states = trimmedStates(automaton)
+    if automaton.start not in states:
+        return [0] * (max_length + 1)
+    matrix = countMatrix(automaton, states).astype(object)
+    accepting = automaton.accepting[states]
+
+    vector = np.zeros(len(states), dtype=object)
+    vector[np.searchsorted(states, automaton.start)] = 1
+    counts = []
+    for _ in range(max_length + 1):
+        counts.append(int(vector[accepting].sum()))
+        vector = vector.dot(matrix)
+    return counts
+
+
+def _components(matrix):
+    """
+    :param matrix: square transfer matrix
+    :return: list of arrays of the positions in each strongly connected component, in no particular order
+    """
+    reach = (matrix > 0) | np.eye(len(matrix), dtype=bool)
+    while True:
+        # squaring doubles the length of the paths accounted for
+        grown = (reach.astype(float) @ reach.astype(float)) > 0
+        if (grown == reach).all():
+            break
+        reach = grown
+    mutual = reach & reach.T
+    components, assigned = [], np.zeros(len(matrix), dtype=bool)
+    for state in range(len(matrix)):
+        if not assigned[state]:
+            components.append(np.flatnonzero(mutual[state]))
+            assigned |= mutual[state]
+    return components
+
+
+def growthRate(automaton, digits=GROWTH_DIGITS):
+    """
+    Method growthRate finds the exponential growth rate of the number of accepted words, the spectral radius of
+    the transfer matrix over the trimmed states. This is the largest spectral radius of its strongly connected
+    components. Each component is irreducible, so its spectral radius is a simple eigenvalue and is found
+    accurately by np.linalg.eigvals, unlike the defective eigenvalues the whole matrix may have
+    :param automaton: Automaton
+    :param digits: number of decimal places the growth rate is rounded to
+    :return: the growth rate rounded to digits decimal places, 0 if the language is finite
+    """
+    states = trimmedStates(automaton)
+    matrix = countMatrix(automaton, states)
+    rate = 0.0
+    for component in _components(matrix):
+        block = matrix[np.ix_(component, component)]
+        if block.any():     # components without a cycle add nothing to the growth
+            rate = max(rate, float(np.abs(np.linalg.eigvals(block.astype(float))).max()))
+    return round(rate, digits)
@@ -0,0 +1,100 @@
+import atexit
+import json
+import os
+import sys
+import time
+
+# TILECHECK_PROFILE switches instrumentation on: 'log' (or '1') writes each record to stderr as a line of JSON when
+# it is made, and any other value is taken as the path of a JSON file the whole profile is written to on exit.
+# When it is unset, record() and stage() return at once, so instrumented code runs at its usual speed.
+PROFILE_TARGET = os.environ.get('TILECHECK_PROFILE', '')
+ENABLED = PROFILE_TARGET not in ('', '0')
+LOG_TARGETS = ('1', 'log')
+
+# bumped whenever the layout of the profile changes
+PROFILE_FORMAT = 1
+
+_records = []
+_started = time.perf_counter()
+
+
+def record(event, **fields):
+    """
+    Method record adds a record to the profile, doing nothing if instrumentation is off
+    :param event: kind of record, eg 'stage' or 'closure_round'
+    :param fields: counters and other values describing the event, which must be JSON serializable
+    """
+    if not ENABLED:
+        return
+    entry = {'event': event, 'time': round(time.perf_counter() - _started, 6), **fields}
+    _records.append(entry)
+    if PROFILE_TARGET in LOG_TARGETS:
+        print(json.dumps(entry), file=sys.stderr, flush=True)
+
+
+class _Stage:
+    """
+    Class _Stage times the block of a with statement, recording it as a 'stage' event when the block ends. The
+    counters dictionary returned on entry can be filled in by the block and is recorded with the timing.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.counters = dict(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.counters
+
+    def __exit__(self, exc_type, exc, traceback):
+        record('stage', stage=self.name, seconds=round(time.perf_counter() - self.start, 6),
+               failed=exc_type is not None, **self.counters)
+        return False
+
+
+class _NoStage:
+    """
+    Class _NoStage stands in for _Stage when instrumentation is off
+    """
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, **fields):
+    """
+    Method stage times a stage of the pipeline, eg
+        with instrument.stage('closure', mode=mode) as counters:
+            ...
+            counters['closure'] = len(closure_props)
+    :param name: name of the stage
+    :param fields: values recorded with the stage
+    :return: context manager giving a dictionary of counters, recorded when the stage ends
+    """
+    return _Stage(name, fields) if ENABLED else _NO_STAGE
+
+
+def profile():
+    """
+    :return: the profile of this process so far, as written to the JSON file
+    """
+    return {'format': PROFILE_FORMAT, 'command': sys.argv, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seconds': round(time.perf_counter() - _started, 6), 'records': _records}
+
+
+def writeProfile(path):
+    """
+    :param path: path of the JSON file the profile is written to
+    """
+    with open(path, 'w') as f:
+        json.dump(profile(), f, indent=1)
+
+
+if ENABLED and PROFILE_TARGET not in LOG_TARGETS:
+    atexit.register(writeProfile, PROFILE_TARGET)
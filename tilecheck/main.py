@@ -1,31 +1,35 @@
-import json
 import copy
+import itertools
+import multiprocessing
+import os
+import time
 import numpy as np
-import utils
-import dfa
-
-tiles = ['AAL', 'ABL', 'AVL', 'ADL', 'BAL', 'BBL', 'BVL', 'BDL', 'VAL', 'VBL', 'VVL',
-         'VDL', 'DAL', 'DBL', 'DVL', 'DDL', 'AIBL', 'AIVL', 'BIAL', 'VIAL', 'HL', 'AAdL',
-         'ABdL', 'AVdL', 'ADdL', 'BAdL', 'BBdL', 'BVdL', 'BDdL', 'VAdL', 'VBdL', 'VVdL',
-         'VDdL', 'DAdL', 'DBdL', 'DVdL', 'DDdL', 'AIBdL', 'AIVdL', 'BIAdL', 'VIAdL', 'HdL']
-
-
-def findPropagation(queue, curr_colouring, colours, adjacency_list):
+from propagation import Propagation, PropagationRegistry
+from closure import growProductTable, batchedClosure, parallelClosure, reverseProductIndex
+from cache import PipelineCache
+from colouring import findWallColourings, bruteForceWallColourings, BRUTE_FORCE_MAX_COLOURINGS
+from tilereader import iterTiles
+from canonical import canonicalKey, tileInvariant, transformProp
+from automaton import Automaton
+import instrument
+
+def findPropagation(queue, curr_colouring, colours, adjacency_list, walls=((1, 2), (3, 4))):
     """
     Method findPropagation attempts to find a colouring of the graph as specified by the
     adjacency list, starting from the colouring specified in currColouring. If a colouring
-    is found, the propagation of the graph considering vertices 1, 2 on the left wall and
-    3, 4 on the right wall is returned.
+    is found, the propagation of the graph considering the vertices of walls[0] on the left wall and
+    those of walls[1] on the right wall is returned.
 
     :param queue: vertices to be coloured next
     :param curr_colouring: current (partial) colouring of graph
     :param colours: colours available
     :param adjacency_list: adjacency list of variables
-    :return: A list of all propagations with left wall (1, 2) right wall (3, 4)
+    :param walls: vertices of the left wall and of the right wall, by default (1, 2) and (3, 4)
+    :return: A list of all propagations with left wall walls[0] right wall walls[1]
     """
 
     if len(queue) == 0:   # If queue empty, no more vertices left to colour (graph is connected)
-        return [((curr_colouring[1], curr_colouring[2]), (curr_colouring[3], curr_colouring[4]))]
+        return [tuple(tuple(curr_colouring[v] for v in wall) for wall in walls)]
     else:
         # Colouring vertex v at top of queue
         v = queue[0]
@@ -51,218 +55,582 @@ def findPropagation(queue, curr_colouring, colours, adjacency_list):
             new_colouring[v] = c
 
             new_queue = copy.deepcopy(queue)
-            result += findPropagation(new_queue, new_colouring, colours, adjacency_list)
+            result += findPropagation(new_queue, new_colouring, colours, adjacency_list, walls)
 
         return sorted(list(set(result)), key=lambda t: t[1][0])
 
 
-def getConcretePropagations(tile):
+def canonicalInput(_input, colours):
+    """
+    Method finds the representative of the orbit of _input under permutations of the colours, obtained by
+    relabelling colours in order of first appearance, together with the permutation taking it back to _input.
+
+    :param _input: tuple of colours of the input vertices
+    :param colours: colours available
+    :return: the representative input and a dictionary mapping its colours to the colours of _input
+    """
+    permutation = {}
+    for colour in _input:
+        if colour not in permutation.values():
+            permutation[colours[len(permutation)]] = colour
+    # remaining colours are mapped onto the unused ones in order
+    unused = [c for c in colours if c not in permutation.values()]
+    for colour in colours[len(permutation):]:
+        permutation[colour] = unused.pop(0)
+    inverse = {v: k for k, v in permutation.items()}
+    return tuple(inverse[c] for c in _input), permutation
+
+
+def getWalls(width):
+    """
+    :param width: number of vertices on each wall
+    :return: vertices of the left wall and of the right wall, ie (1, ..., width) and (width + 1, ..., 2 * width)
+    """
+    return tuple(range(1, width + 1)), tuple(range(width + 1, 2 * width + 1))
+
+
+def getConcretePropagations(tile, engine='auto', symmetry='orbits', colours=3, width=2, stats=None):
     """
-    Method getConcretePropagations returns all the 'concrete' 3-propagations of the tile specified in
+    Method getConcretePropagations returns all the 'concrete' k-propagations of the tile specified in
     tileID, that is all possible colourings of the input and output vertices.
 
-    :param tile:
-    :return:
+    :param tile: adjacency list of the tile, with vertices 1, ..., width on the left wall and width + 1, ...,
+                 2 * width on the right wall (by default 1, 2 and 3, 4)
+    :param engine: 'bitmask' uses the iterative search in colouring.findWallColourings, 'recursive' uses
+                   findPropagation and 'numpy' enumerates every colouring with colouring.bruteForceWallColourings.
+                   'auto' uses 'numpy' for tiles with at most colouring.BRUTE_FORCE_MAX_COLOURINGS colourings and
+                   'bitmask' otherwise, and 'check' uses both 'numpy' and 'bitmask', raising an exception if they
+                   differ. All give the same propagations.
+    :param symmetry: 'none' searches for colourings of every input. 'orbits' only searches the representatives
+                     of inputs under permutations of colours, eg (1, 1) and (1, 2) for 3 colours and walls of
+                     width 2, and permutes their colourings to get those of the other inputs. 'check' does both
+                     and raises an exception if they differ. The 'numpy' engine finds the colourings of all inputs
+                     at once, so does not use symmetry.
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    :param stats: dictionary whose 'search_nodes' count is increased by the nodes visited by the 'bitmask' engine,
+                  and whose 'colourings' count is increased by the colourings enumerated by the 'numpy' engine
+    :return: list of concrete propagations (c1, ..., c2w) giving the colours of vertices 1, ..., 2w, in order
     """
+    colours = [str(c) for c in range(1, colours + 1)]
+    left_wall, right_wall = getWalls(width)
+    if symmetry not in ('none', 'orbits', 'check'):
+        raise ValueError(f'Unknown symmetry mode {symmetry}')
+
+    if engine == 'auto':
+        engine = 'numpy' if len(colours) ** len(tile) <= BRUTE_FORCE_MAX_COLOURINGS else 'bitmask'
+    if engine in ('numpy', 'check'):
+        propagations = sorted(bruteForceWallColourings(tile, colours, left_wall + right_wall, stats=stats))
+        if engine == 'check' and propagations != getConcretePropagations(tile, 'bitmask', symmetry, len(colours),
+                                                                         width, stats):
+            raise Exception(f'Unexpected behaviour! The numpy and bitmask engines give different concrete '
+                            f'propagations for tile {tile}')
+        return propagations
+
+    def search(_input):
+        # finding all concrete propagations of the tile with the left wall coloured as in _input
+        if engine == 'bitmask':
+            return sorted(findWallColourings(tile, dict(zip(left_wall, _input)), colours,
+                                             left_wall + right_wall, stats))
+        elif engine != 'recursive':
+            raise ValueError(f'Unknown colouring engine {engine}')
+
+        colouring = dict.fromkeys(tile.keys(), '')
+        colouring.update(zip(left_wall, _input))
+
+        queue = []
+        for w in left_wall:
+            for v in tile[w]:
+                if v not in left_wall and v not in queue: queue.append(v)
+
+        return [p[0] + p[1] for p in findPropagation(queue, colouring, colours, tile, (left_wall, right_wall))]
+
     propagations = []
+    representative_props = {}   # concrete propagations found for each orbit representative
 
-    for _input in [('1', '1'), ('1', '2'), ('1', '3'),
-                   ('2', '1'), ('2', '2'), ('2', '3'),
-                   ('3', '1'), ('3', '2'), ('3', '3')]:
-        if 2 in tile[1] and _input[0] == _input[1]:
+    for _input in itertools.product(colours, repeat=width):
+        # skipping inputs where adjacent vertices of the left wall share a colour
+        if any(u in tile[v] and _input[i] == _input[j]
+               for i, v in enumerate(left_wall) for j, u in enumerate(left_wall) if i < j):
             continue
 
-        colouring = dict.fromkeys(tile.keys(), '')
-        colouring[1] = _input[0]
-        colouring[2] = _input[1]
+        if symmetry == 'none':
+            propagations += search(_input)
+            continue
 
-        queue = []
-        for v in tile[1]:
-            if v != 2: queue.append(v)
+        representative, permutation = canonicalInput(_input, colours)
+        if representative not in representative_props:
+            representative_props[representative] = search(representative)
+        permuted = sorted(tuple(permutation[c] for c in p) for p in representative_props[representative])
 
-        for p in findPropagation(queue, colouring, ['1', '2', '3'], tile):
-            propagations.append((p[0][0], p[0][1], p[1][0], p[1][1]))
+        if symmetry == 'check' and permuted != sorted(search(_input)):
+            raise Exception(f'Unexpected behaviour! Concrete propagations for input {_input} are not a '
+                            f'permutation of those for {representative}')
+        propagations += permuted
     return propagations
 
 
-def getAdjProp(concretePropagations):
+def getAdjProp(concretePropagations, colours=3, width=2):
     """
     Method finds and returns the adjacency matrix that represents the propagation graph of
     a tile given its concrete propagations, ie a list of permissible transitions from a colouring
-    to a colouring using said tile. We join (a, b) to (c,d) by identifying a with d and b with c.
+    to a colouring using said tile. We join (a, b) to (c,d) by identifying a with d and b with c,
+    and in general reverse the right wall before joining.
 
     :param concretePropagations: list of propagations in concrete form ie (1,1) ~> (2,3)
-    :return: returns an adjacency matrix that represents the graph with vertices being all
-    3 colourings of 2 vertices, with edges if a propagation can take you from one colouring
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    :return: returns a Propagation whose adjacency matrix represents the graph with vertices being all
+    k colourings of w vertices, with edges if a propagation can take you from one colouring
     to the next.
     """
-    m = np.zeros((9, 9), dtype=int)
+    size = colours ** width
+    rows = [0] * size
     for edge in concretePropagations:
-        # x1, x2 are input colours which lead to output colours y1, y2
-        x1 = int(edge[0])
-        x2 = int(edge[1])
-        y1 = int(edge[3])  # recall we flip end vertices before joining!
-        y2 = int(edge[2])
+        # x are input colours which lead to output colours y
+        x = [int(c) for c in edge[:width]]
+        y = [int(c) for c in reversed(edge[width:])]  # recall we flip end vertices before joining!
 
-        # positions are as following:
+        # positions are as following (for 3 colours and width 2):
         # (1, 1), (1, 2), (1, 3), (2, 1), (2, 2) ... (3, 3)
-        # equations below give the above ordering
-        row_position = (3 * (x1 - 1)) + (x2 - 1)
-        col_position = (3 * (y1 - 1)) + (y2 - 1)
+        # ie colourings are read as numbers in base k, giving the above ordering
+        row_position = 0
+        col_position = 0
+        for i in range(width):
+            row_position = colours * row_position + (x[i] - 1)
+            col_position = colours * col_position + (y[i] - 1)
 
-        # since there is an edge, set value to 1
-        m[row_position][col_position] = 1
-    return m
+        # since there is an edge, set the bit for col_position in the row's bitmask
+        rows[row_position] |= 1 << col_position
+    return Propagation.from_rows(rows, size)
 
 
-def getTilePropagations(tile_adjacencies):
+def getTileProp(tile_item):
+    """
+    Method getTileProp finds the propagation of a single tile, in a form which can be sent to worker processes.
+    :param tile_item: tuple (tile, adjacency, colours, width, engine) of the tile name, its adjacency information
+                      as stored in the json file, the number of colours, the wall width and the colouring engine
+                      used by getConcretePropagations
+    :return: the tile name, its Propagation and, if instrumentation is on, a dictionary of counters of the search
+             (None otherwise). The counters are returned rather than recorded, as workers do not share the profile
+    """
+    tile, adjacency, colours, width, engine = tile_item
+    # getting adjacency matrix for the tile
+    tile_set = {int(k): v for k, v in adjacency.items()}
+    if not instrument.ENABLED:
+        return tile, getAdjProp(getConcretePropagations(tile_set, engine, colours=colours, width=width), colours,
+                                width), None
+
+    start = time.perf_counter()
+    stats = {'search_nodes': 0, 'colourings': 0}
+    concrete = getConcretePropagations(tile_set, engine, colours=colours, width=width, stats=stats)
+    stats.update(vertices=len(tile_set), concrete_propagations=len(concrete),
+                 seconds=round(time.perf_counter() - start, 6))
+    return tile, getAdjProp(concrete, colours, width), stats
+
+
+def getTileKey(key_item):
+    """
+    Method getTileKey finds the canonical key of a single tile, in a form which can be sent to worker processes.
+    :param key_item: tuple (adjacency, width) of the adjacency information of a tile as stored in the json file and
+                     the wall width
+    :return: the canonical key and symmetry of the tile, as returned by canonical.canonicalKey
+    """
+    adjacency, width = key_item
+    return canonicalKey({int(k): v for k, v in adjacency.items()}, width)
+
+
+def getTilePropagations(tile_adjacencies, colours=3, width=2, mode='serial', processes=None, chunksize=None,
+                        canonical=False, engine='auto'):
     """
     Method getTilePropagations takes a file containing tiles and their structure, and returns
-    all unique propagations that come out of the 42 tiles, as well as a mapping from tile to
-    propagation.
-    :param tile_adjacencies: json file containing adjacency information of each tile
+    all unique propagations that come out of the tiles, as well as a mapping from tile to
+    propagation. Tiles are processed in the order they appear in tile_adjacencies, which may be
+    a stream such as tilereader.iterTiles(path) so that only distinct propagations are kept in memory.
+    :param tile_adjacencies: json file containing adjacency information of each tile, either as a
+                             dictionary or as an iterable of (tile, adjacency) pairs
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    :param mode: 'serial' processes tiles one at a time, 'parallel' spreads them over a process pool
+    :param processes: number of worker processes used in 'parallel' mode, defaults to the number of CPUs
+    :param chunksize: number of tiles sent to a worker at a time in 'parallel' mode
+    :param canonical: if True, colourings are only searched for one tile of each canonical form (see
+                      canonical.canonicalTile), and tiles which are isomorphic up to reflection reuse its propagation.
+                      Canonical forms are only found for tiles whose canonical.tileInvariant has been seen before,
+                      and tiles whose form is not found within canonical.CANONICAL_BUDGET search nodes are searched
+                      directly. Finding forms costs more than searching small tiles, so this only pays off on
+                      libraries with many isomorphic tiles
+    :param engine: colouring engine used for each tile, as in getConcretePropagations. 'check' cross-validates the
+                   numpy engine against the bitmask engine on every tile, so it turns canonical off, as otherwise
+                   only one tile of each canonical form would be checked
     :return: returns a list of all propagations extracted from each tile
              and a dictionary that maps each tile to its propagation matrix
     """
 
-    tile_props = []  # stores all unique propagations that come out of the 42 tiles
+    canonical = canonical and engine != 'check'
+    tile_props = PropagationRegistry()  # stores all unique propagations that come out of the tiles
     tile_prop_mapping = {}  # dictionary that maps a tile to its propagation matrix
+    canonical_props = {}    # maps keys of canonical forms to the propagation of the tile they encode
+    invariants = set()      # invariants of the tiles seen so far
+
+    def searched(results):
+        # dropping the counters of each search after recording them
+        for tile, prop, stats in results:
+            if stats is not None:
+                instrument.record('tile', tile=tile, **stats)
+            yield tile, prop
+
+    def process(batch, compute, canonicalize):
+        # finding the propagations of a batch of (tile, adjacency) pairs, searching once per new canonical form
+        if not canonical:
+            return searched(compute([(tile, adjacency, colours, width, engine) for tile, adjacency in batch]))
+
+        # canonical forms are only found for tiles which may share one with an earlier tile, as their invariants
+        # match; the rest, and tiles without a canonical form, are keyed by their position in the batch and are not
+        # remembered
+        repeated = []
+        for i, (_, adjacency) in enumerate(batch):
+            invariant = tileInvariant({int(k): v for k, v in adjacency.items()}, width)
+            if invariant in invariants:
+                repeated.append(i)
+            invariants.add(invariant)
+        keys = [(i, 'identity') for i in range(len(batch))]
+        for i, (key, symmetry) in zip(repeated, canonicalize([(batch[i][1], width) for i in repeated])):
+            if key is not None:
+                keys[i] = (key, symmetry)
+        pending = {}    # new canonical forms, with a tile having that form and the symmetry taking it there
+        for (tile, adjacency), (key, symmetry) in zip(batch, keys):
+            if key not in canonical_props and key not in pending:
+                pending[key] = ((tile, adjacency, colours, width, engine), symmetry)
+
+        for key, (_, prop) in zip(list(pending), searched(compute([item for item, _ in pending.values()]))):
+            canonical_props[key] = transformProp(prop, pending[key][1], colours, width)
+
+        # reflecting the stored propagations back onto each tile (every symmetry is its own inverse)
+        result = [(tile, transformProp(canonical_props[key], symmetry, colours, width))
+                  for (tile, _), (key, symmetry) in zip(batch, keys)]
+        for key, _ in keys:
+            if isinstance(key, int):
+                del canonical_props[key]
+        return result
+
+    if hasattr(tile_adjacencies, 'items'):
+        tile_adjacencies = tile_adjacencies.items()
+    tile_adjacencies = iter(tile_adjacencies)
+
+    if mode not in ('parallel', 'serial'):
+        raise ValueError(f'Unknown tile processing mode {mode}')
+
+    with instrument.stage('extract', mode=mode, engine=engine) as counters:
+        if mode == 'parallel':
+            processes = processes or multiprocessing.cpu_count()
+            chunksize = chunksize or 16
+            with multiprocessing.Pool(processes) as pool:
+                # feeding the pool a batch at a time, as imap would otherwise read the whole stream ahead
+                for batch in iter(lambda: list(itertools.islice(tile_adjacencies, 8 * processes * chunksize)), []):
+                    # imap keeps the tiles in order, so ids of propagations are the same as in serial mode
+                    # canonical keys are found by the workers too, then each new form is searched once
+                    for tile, new_prop in process(batch, lambda items: pool.imap(getTileProp, items, chunksize),
+                                                  lambda items: pool.imap(getTileKey, items, chunksize)):
+                        storeTileProp(tile, new_prop, tile_props, tile_prop_mapping)
+        else:
+            for tile_adjacency in tile_adjacencies:
+                for tile, new_prop in process([tile_adjacency], lambda items: map(getTileProp, items),
+                                              lambda items: map(getTileKey, items)):
+                    storeTileProp(tile, new_prop, tile_props, tile_prop_mapping)
+
+        counters.update(tiles=len(tile_prop_mapping), canonical_forms=len(canonical_props),
+                        tile_props=len(tile_props))
+    return tile_props.props, tile_prop_mapping
+
+
+def storeTileProp(tile, new_prop, tile_props, tile_prop_mapping):
+    """
+    Method storeTileProp records the propagation of a tile, mapping the tile to the stored copy of its
+    propagation so that tiles with equal propagations share a single object.
+    :param tile: tile name
+    :param new_prop: Propagation of the tile
+    :param tile_props: PropagationRegistry of all unique tile propagations
+    :param tile_prop_mapping: dictionary mapping tiles to their propagations
+    """
+    # adding new_prop to tile_props if it is not already stored
+    prop_id, _ = tile_props.add(new_prop)
+    # storing in dictionary
+    tile_prop_mapping[tile] = tile_props[prop_id]
 
-    for tile in tiles:
-        # getting adjacency matrix for the tile
-        tile_set = {int(k): v for k, v in tile_adjacencies[tile].items()}
 
-        new_prop = getAdjProp(getConcretePropagations(tile_set))
-        # storing in dictionary
-        tile_prop_mapping[tile] = new_prop
+def getPropagationClosure(starting_props, mode='serial', processes=None):
+    """
+    Method getPropagationClosure calculates the closure of matrices in starting_props.
 
-        # checking if new_prop is already stored in tile_props
-        stored = False
-        for prop in tile_props:
-            if utils.props_equal(prop, new_prop):
-                stored = True
-        # if not, add it to tile_props
-        if not stored:
-            tile_props += [new_prop]
+    :param starting_props: Starting set of propagations
+    :param mode: 'serial' multiplies propagations one pair at a time, 'batched' uses the vectorized engine
+                 in closure.batchedClosure and 'parallel' spreads it over a process pool with
+                 closure.parallelClosure. All modes give the same closure and product table.
+    :param processes: number of worker processes used in 'parallel' mode, defaults to the number of CPUs
+    :return: closure_props: a PropagationRegistry containing all propagations that arise from normalised matrix
+                            multiplication starting from starting_props, with the starting props first.
+                            closure_props[i] (or row i of closure_props.to_array()) is the propagation with id i
+             product_table: an n x n int32 array which encodes the result of the multiplication of any two
+                            propagations in closure_props, ie product_table[i][j] is the id of the product of
+                            the propagations with ids i and j
+    """
+    closure_props = PropagationRegistry(starting_props)
+    product_table = np.full((len(closure_props), len(closure_props)), -1, dtype=np.int32)
 
-    return tile_props, tile_prop_mapping
+    return closePropagations(closure_props, product_table, 0, mode, processes)
 
 
-def getPropagationClosure(starting_props):
+def extendPropagationClosure(closure_props, product_table, new_props, mode='serial', processes=None):
     """
-    Method getPropagationClosure calculates the closure of matrices in starting_props.
+    Method extendPropagationClosure adds new generators to an existing closure. The existing closure is taken to
+    be the old propagations and the new generators the first new ones, so only products involving new
+    propagations are calculated. The resulting closure is the same as that of a full recomputation from all
+    generators, with the ids of the existing propagations left unchanged.
+
+    :param closure_props: PropagationRegistry of a closure, as returned by getPropagationClosure
+    :param product_table: product table of closure_props
+    :param new_props: new generator propagations
+    :param mode: closure engine to be used, as in getPropagationClosure
+    :param processes: number of worker processes used in 'parallel' mode
+    :return: closure_props, product_table of the extended closure, as new objects
+    """
+    closed_count = len(closure_props)
+    closure_props = PropagationRegistry(closure_props)
+    for prop in new_props:
+        closure_props.add(prop)
+    product_table = growProductTable(np.array(product_table, dtype=np.int32), len(closure_props))
 
-    :param starting_props: Starting set of propagations
-    :return: closure_props: a list containing all propagations that arise from normalised matrix multiplication
-                            starting from starting_props
-             propagation_combinations: a dictionary which encodes the result of the multiplication of any
-                            two propagations in all_props
+    return closePropagations(closure_props, product_table, closed_count, mode, processes)
+
+
+def closePropagations(closure_props, product_table, closed_count, mode='serial', processes=None):
+    """
+    Method closePropagations closes closure_props under multiplication. Propagations with ids below closed_count
+    must already be closed, with their products stored in product_table, and the rest are the first new ones.
+
+    :param closure_props: PropagationRegistry of propagations found so far, to which the closure is added
+    :param product_table: int32 array holding the products of the first closed_count propagations
+    :param closed_count: number of propagations whose products are already calculated
+    :param mode: 'serial', 'batched' or 'parallel', as in getPropagationClosure
+    :param processes: number of worker processes used in 'parallel' mode
+    :return: closure_props and the n x n product table
     """
-    propagation_combinations = {}
+    if mode not in ('serial', 'batched', 'parallel'):
+        raise ValueError(f'Unknown closure mode {mode}')
 
-    closure_props = starting_props.copy()
-    new_props = starting_props.copy()
-    old_props = []
+    with instrument.stage('closure', mode=mode, closed=closed_count, generators=len(closure_props)) as counters:
+        if mode == 'batched':
+            closure_props, product_table = batchedClosure(closure_props, product_table, closed_count)
+        elif mode == 'parallel':
+            closure_props, product_table = parallelClosure(closure_props, product_table, closed_count, processes)
+        else:
+            closure_props, product_table = serialClosure(closure_props, product_table, closed_count)
+        counters['closure'] = len(closure_props)
+    return closure_props, product_table
+
+
+def serialClosure(closure_props, product_table, closed_count):
+    """
+    Method serialClosure closes closure_props under multiplication one pair of propagations at a time
+    :param closure_props: PropagationRegistry of propagations found so far, to which the closure is added
+    :param product_table: int32 array holding the products of the first closed_count propagations
+    :param closed_count: number of propagations whose products are already calculated
+    :return: closure_props and the n x n product table
+    """
+    new_ids = list(range(closed_count, len(closure_props)))
+    old_ids = list(range(closed_count))
     # Iterate until no new propagations are found
-    while new_props:
-        next_props = []
+    while new_ids:
+        next_ids = []
+        round_start = time.perf_counter()
 
-        # initialising all new propagations
-        for prop in new_props:
-            propagation_combinations[utils.getStringRep(prop)] = {}
+        # making space for products of all new propagations
+        product_table = growProductTable(product_table, len(closure_props))
 
         # Calculating old * new and new * old
-        for prop1 in old_props:
-            for prop2 in new_props:
+        for id1 in old_ids:
+            prop1 = closure_props[id1]
+            for id2 in new_ids:
+                prop2 = closure_props[id2]
 
                 # Sanity check that new propagation is indeed new
-                if utils.getStringRep(prop2) in propagation_combinations[utils.getStringRep(prop1)]:
+                if product_table[id1, id2] != -1:
                     raise Exception(f'Unexpected behaviour! Propagation {prop2} is new, but {prop1}*{prop2} was '
                                     f'already calculated')
 
-                # Order prop1 * prop2
-                combination1, stored1 = utils.get_combination(prop1, prop2, closure_props)
-                propagation_combinations[utils.getStringRep(prop1)][utils.getStringRep(prop2)] = combination1
-                # If propagation newly encountered, add it to all_props
-                if not stored1:
-                    closure_props += [combination1]
-                    next_props += [combination1]
+                # Order prop1 * prop2, adding the result to closure_props if newly encountered
+                combination1, new1 = closure_props.add(prop1 * prop2)
+                product_table[id1, id2] = combination1
+                if new1:
+                    next_ids += [combination1]
 
                 # order prop2 *prop1
-                combination2, stored2 = utils.get_combination(prop2, prop1, closure_props)
-                propagation_combinations[utils.getStringRep(prop2)][utils.getStringRep(prop1)] = combination2
-                # if propagation newly encountered, add it to all_props
-                if not stored2:
-                    closure_props += [combination2]
-                    next_props += [combination2]
+                combination2, new2 = closure_props.add(prop2 * prop1)
+                product_table[id2, id1] = combination2
+                if new2:
+                    next_ids += [combination2]
 
         # Finding combinations of new * new
-        for prop1 in new_props:
-            for prop2 in new_props:
+        for id1 in new_ids:
+            prop1 = closure_props[id1]
+            for id2 in new_ids:
                 # Sanity check for new propagation
-                if utils.getStringRep(prop2) in propagation_combinations[utils.getStringRep(prop1)]:
-                    raise Exception(f'Unexpected behaviour! Propagations {prop1} and {prop2} are new, but '
-                                    f'{prop1}*{prop2} has already been calculated.')
+                if product_table[id1, id2] != -1:
+                    raise Exception(f'Unexpected behaviour! Propagations {prop1} and {closure_props[id2]} are new, '
+                                    f'but {prop1}*{closure_props[id2]} has already been calculated.')
 
-                combination, stored = utils.get_combination(prop1, prop2, closure_props)
-                # Storing the propagation in propagation_combinations
-                propagation_combinations[utils.getStringRep(prop1)][utils.getStringRep(prop2)] = combination
+                combination, new = closure_props.add(prop1 * closure_props[id2])
+                # Storing the propagation id in product_table
+                product_table[id1, id2] = combination
 
                 # Checking if propagation is newly encountered
-                if not stored:
-                    closure_props += [combination]  # adding new propagation to all_props
-                    next_props += [combination]
-
-        # Updating old_props to include the now calculated propagations
-        old_props = old_props + new_props
-        # Changing the new_props to be the most recently found new ones
-        new_props = next_props
-
-    return closure_props, propagation_combinations
-
-
-def get_predecessors(propagations, resulting_props, propagation_combinations, edge_labels):
-    predecessors = resulting_props.copy()
-    edge_list = []
-
-    for prop1 in propagations:
-        for prop2 in propagations:
-            # Checking if prop1 * prop2 results in resulting_props
-            combination = propagation_combinations[utils.getStringRep(prop1)][(utils.getStringRep(prop2))]
-            if utils.prop_in_list(combination, resulting_props):
-                # adding components if they are not already in the prop list
-                for prop in [prop1, prop2]:
-                    if not utils.prop_in_list(prop, predecessors):
-                        predecessors += [prop]
-
-    # filtered edge label keeps as edges only successor propagations in edge_label
-    filt_edge_label = []
-    for edge_label in edge_labels:
-        if utils.prop_in_list(edge_label, predecessors):
-            filt_edge_label += [edge_label]
-
-    # vertices will just be numbers 0, 1, 2 ... m for simplicity's sake
-    vertices = list(range(0, len(predecessors)))
-    vertex_prop_map = {}    # mapping propagations with vertices
-    edge_indices = []
-    final_states = []
-    for i, prop in enumerate(predecessors):
-        vertex_prop_map[i] = prop
-        # vertex is an edge if it is in filt_edge_label
-        if utils.prop_in_list(prop, filt_edge_label):
-            edge_indices += [i]
-        # vertex is a final state if it is in resulting_props
-        if utils.prop_in_list(prop, resulting_props):
-            final_states += [i]
-
-    # defining edge list (v1, l, v2) where v1 -l-> v2 if v1*l = v2
-    for prop1 in predecessors:
-        for prop2 in filt_edge_label:
-            combination = propagation_combinations[utils.getStringRep(prop1)][(utils.getStringRep(prop2))]
-            if utils.prop_in_list(combination, predecessors):
-                edge_list += [(utils.get_index(prop1, predecessors), utils.get_index(prop2, predecessors),
-                               utils.get_index(combination, predecessors))]
+                if new:
+                    next_ids += [combination]
+
+        instrument.record('closure_round', mode='serial', frontier=len(new_ids), old=len(old_ids),
+                          products=len(new_ids) * (2 * len(old_ids) + len(new_ids)), new=len(next_ids),
+                          seconds=round(time.perf_counter() - round_start, 6))
 
+        # Updating old_ids to include the now calculated propagations
+        old_ids = old_ids + new_ids
+        # Changing the new_ids to be the most recently found new ones
+        new_ids = next_ids
+
+    n = len(closure_props)
+    return closure_props, np.ascontiguousarray(product_table[:n, :n])
+
+
+def get_predecessors(propagations, resulting_props, product_table, edge_labels):
+    """
+    Method get_predecessors finds all propagations from which one of resulting_props can be reached by
+    multiplying on the right by edge labels, and builds the transition function of the automaton over them.
+    It is a backward breadth first search from resulting_props over a reverse index of the product table, listing
+    for each propagation the (propagation, label) pairs whose product gives it, so each edge is visited once.
+
+    :param propagations: PropagationRegistry of the closure, as returned by getPropagationClosure
+    :param resulting_props: list of propagations to be reached
+    :param product_table: product table of the closure, indexed by ids in propagations
+    :param edge_labels: list of propagations used as edge labels (the tile propagations)
+    :return: vertices, edge_list, edge_indices, vertex_prop_map, final_states, where vertices, edge_indices and
+             final_states are integer arrays of vertices and edge_list is an (edges, 3) array of triples (v1, l, v2)
+             such that v1 * l = v2
+    """
+    with instrument.stage('predecessors') as counters:
+        n = len(propagations)
+        label_ids = np.array(list(dict.fromkeys(propagations.index(label) for label in edge_labels)), dtype=np.int64)
+        result_ids = np.array(list(dict.fromkeys(propagations.index(prop) for prop in resulting_props)),
+                              dtype=np.int64)
+
+        pairs, offsets, targets = reverseProductIndex(product_table, label_ids)
+
+        # vertices are numbered with resulting props first, then in the order they are found
+        vertex_of_id = np.full(n, -1, dtype=np.int32)
+        vertex_of_id[result_ids] = np.arange(len(result_ids))
+        vertex_ids = [result_ids]
+        count = len(result_ids)
+        found_pairs = []
+        frontier = result_ids
+        while len(frontier):
+            frontier_pairs = np.concatenate([pairs[offsets[t]:offsets[t + 1]] for t in frontier])
+            found_pairs.append(frontier_pairs)
+            sources = frontier_pairs // len(label_ids)
+            sources = sources[vertex_of_id[sources] == -1]
+            _, first = np.unique(sources, return_index=True)
+            frontier = sources[np.sort(first)]
+            vertex_of_id[frontier] = np.arange(count, count + len(frontier))
+            vertex_ids.append(frontier)
+            count += len(frontier)
+        vertex_ids = np.concatenate(vertex_ids)
+
+        # every pair found joins two vertices; it is kept as an edge if its label is itself a vertex
+        found_pairs = np.concatenate(found_pairs) if found_pairs else np.zeros(0, dtype=np.int64)
+        sources, labels = np.divmod(found_pairs, len(label_ids))
+        edge_list = np.stack([vertex_of_id[sources], vertex_of_id[label_ids[labels]],
+                              vertex_of_id[targets[found_pairs]]], axis=1).astype(np.int32)
+        edge_list = edge_list[edge_list[:, 1] != -1]
+        edge_list = edge_list[np.lexsort((edge_list[:, 1], edge_list[:, 0]))]
+
+        vertices = np.arange(count, dtype=np.int32)
+        vertex_prop_map = {v: propagations[i] for v, i in enumerate(vertex_ids.tolist())}
+        edge_indices = np.flatnonzero(np.isin(vertex_ids, label_ids)).astype(np.int32)
+        final_states = np.arange(len(result_ids), dtype=np.int32)
+        counters.update(closure=n, results=len(result_ids), labels=len(label_ids), states=count,
+                        edges=len(edge_list))
+    return vertices, edge_list, edge_indices, vertex_prop_map, final_states
+
+
+def cachedTilePropagations(cache, tiling_path, colours=3, width=2):
+    """
+    Method cachedTilePropagations returns the result of getTilePropagations for the tiles in tiling_path, loading
+    it from cache if present. The tiling file is only streamed on a cache miss, after which the result is stored.
+
+    :param cache: PipelineCache for tiling_path, or None to always recompute
+    :param tiling_path: path of the json (or JSON Lines) file containing adjacency information of each tile
+    :param colours: number of colours k
+    :param width: number of vertices w on each wall
+    :return: tile_props, tile_prop_mapping as returned by getTilePropagations
+    """
+    if cache is not None and cache.hasStage('tile_props'):
+        instrument.record('cache_hit', artifact='tile_props')
+        meta = cache.loadJson('tile_prop_mapping')
+        tile_props = PropagationRegistry.from_array(cache.load('tile_props'), meta['size']).props
+        return tile_props, {tile: tile_props[i] for tile, i in meta['tiles'].items()}
+
+    tile_props, tile_prop_mapping = getTilePropagations(iterTiles(tiling_path), colours, width)
+
+    if cache is not None:
+        registry = PropagationRegistry(tile_props)
+        cache.saveStage('tile_props', arrays={'tile_props': registry.to_array()},
+                        objects={'tile_prop_mapping': {'size': tile_props[0].size,
+                                                       'tiles': {tile: registry.index(prop)
+                                                                 for tile, prop in tile_prop_mapping.items()}}})
+    return tile_props, tile_prop_mapping
+
+
+def cachedPropagationClosure(cache, starting_props, mode='batched'):
+    """
+    Method cachedPropagationClosure returns the result of getPropagationClosure, loading it from cache if present.
+    A cached product table is memory mapped rather than read into memory.
+
+    :param cache: PipelineCache, or None to always recompute
+    :param starting_props: Starting set of propagations
+    :param mode: closure engine used on a cache miss, as in getPropagationClosure
+    :return: closure_props, product_table as returned by getPropagationClosure
+    """
+    size = starting_props[0].size
+    if cache is not None and cache.hasStage('closure'):
+        instrument.record('cache_hit', artifact='product_table')
+        return PropagationRegistry.from_array(cache.load('closure_props'), size), cache.load('product_table')
+
+    closure_props, product_table = getPropagationClosure(starting_props, mode)
+
+    if cache is not None:
+        cache.saveStage('closure', arrays={'closure_props': closure_props.to_array(), 'product_table': product_table})
+    return closure_props, product_table
+
+
+def cachedPredecessors(cache, propagations, resulting_props, product_table, edge_labels):
+    """
+    Method cachedPredecessors returns the result of get_predecessors, loading it from cache if present.
+
+    :param cache: PipelineCache, or None to always recompute
+    :return: vertices, edge_list, edge_indices, vertex_prop_map, final_states as returned by get_predecessors
+    """
+    size = propagations[0].size
+    if cache is not None and cache.hasStage('predecessors'):
+        instrument.record('cache_hit', artifact='edge_list')
+        vertex_props = PropagationRegistry.from_array(cache.load('vertex_props'), size)
+        return (np.arange(len(vertex_props), dtype=np.int32), cache.load('edge_list'), cache.load('edge_indices'),
+                dict(enumerate(vertex_props)), cache.load('final_states'))
+
+    vertices, edge_list, edge_indices, vertex_prop_map, final_states = \
+        get_predecessors(propagations, resulting_props, product_table, edge_labels)
+
+    if cache is not None:
+        cache.saveStage('predecessors', arrays={
+            'vertex_props': PropagationRegistry(vertex_prop_map[v] for v in vertices).to_array(),
+            'edge_list': edge_list, 'edge_indices': edge_indices, 'final_states': final_states})
     return vertices, edge_list, edge_indices, vertex_prop_map, final_states
 
 
@@ -277,81 +645,71 @@ def find_corresponding_labels(indices, map_index_to_prop, map_prop_to_label):
     :param map_prop_to_label: map from propagations to labels
     :return: label_vertex_map: a map from labels to indices (integers)
     """
+    # grouping labels by their propagation so each index is matched with a single lookup
+    prop_labels = {}
+    for label, prop in map_prop_to_label.items():
+        prop_labels.setdefault(prop, []).append(label)
+
     label_vertex_map = {}
     for index in indices:
-        # finding corresponding propagation for index
-        prop = map_index_to_prop[index]
-        # storing any label that has propagation prop
-        for label in map_prop_to_label.keys():
-            if utils.props_equal(map_prop_to_label[label], prop):
-                label_vertex_map[label] = index
+        # storing any label that has the propagation corresponding to index
+        for label in prop_labels.get(map_index_to_prop[index], []):
+            label_vertex_map[label] = int(index)
     return label_vertex_map
 
 
-def get_trans(triples, state, input_symbol):
-    if state == -1:
-        return input_symbol
-
-    match = -1
-    # trying to find if (state, input_symbol, y) is a triple in triples
-    for t in triples:
-        if t[0] == state and t[1] == input_symbol:
-            match = t[2]
-
-    if match == -1:  # case no match found
-        return -2
-    else:
-        return match
-
-
 if __name__ == "__main__":
-    tile_data = json.load(open("tilings_2.json"))
+    # artifacts are cached between runs unless TILECHECK_NO_CACHE is set
+    # and each stage is profiled if TILECHECK_PROFILE is set, see instrument.py
+    colours, width = 3, 2
+    cache = None if os.environ.get('TILECHECK_NO_CACHE') else PipelineCache("tilings_2.json", colours, width)
+
     # getting tile propagations
-    tile_props, tile_prop_mapping = getTilePropagations(tile_data)
+    tile_props, tile_prop_mapping = cachedTilePropagations(cache, "tilings_2.json", colours, width)
 
     # finding closure of propagations under multiplication
-    all_props, mult_result = getPropagationClosure(tile_props)
+    all_props, product_table = cachedPropagationClosure(cache, tile_props)
 
-    # finding all 4 chromatic propagations
+    # finding all 4 chromatic propagations, ie those taking no colouring of the wall back to itself
+    # (with 3 colours, by symmetry it suffices that (1, 1) and (1, 2) are not taken to themselves)
     four_chrom_props = []
     for prop in all_props:
-        if prop[0][0] == 0 and prop[1][1] == 0:
+        if not prop.has_fixed_point():
             four_chrom_props += [prop]
 
     # calculating vertices, edges and final states of automata, representing propagations as integers
     vertices, edge_list, edge_indices, vertex_prop_map, final_states = \
-        get_predecessors(all_props, four_chrom_props, mult_result, tile_props)
+        cachedPredecessors(cache, all_props, four_chrom_props, product_table, tile_props)
 
     # finding map from tiles to integers representing propagations
     tile_vertex_map = find_corresponding_labels(edge_indices, vertex_prop_map, tile_prop_mapping)
 
-    print("States ", vertices)
-    print("Final states", final_states)
-    print("Alphabet ", edge_indices)
-    print("Transition function", edge_list)
+    print("States ", vertices.tolist())
+    print("Final states", final_states.tolist())
+    print("Alphabet ", edge_indices.tolist())
+    print("Transition function", [tuple(edge) for edge in edge_list.tolist()])
     print(len(edge_list))
     print("Tiles to numbers", tile_vertex_map)
 
-    automata = dfa.DFA(
-        start=-1,
-        inputs=tile_vertex_map.keys(),
-        label=lambda s: s in final_states,
-        transition=lambda s, c: get_trans(edge_list, s, tile_vertex_map[c]),
+    # compiling the automaton over the whole closure, whose states are propagation ids, for classify.py
+    final_ids = [all_props.index(prop) for prop in four_chrom_props]
+    Automaton.fromProductTable(
+        product_table,
+        final_ids=final_ids,
+        letter_ids={tile: all_props.index(prop) for tile, prop in tile_prop_mapping.items()},
+    ).save("automaton.npz")
+
+    # automaton over propagation ids of the predecessors, read off the product table
+    automata = Automaton.fromProductTable(
+        product_table,
+        final_ids=final_ids,
+        letter_ids={tile: all_props.index(vertex_prop_map[v]) for tile, v in tile_vertex_map.items()},
+        states=[all_props.index(vertex_prop_map[v]) for v in vertices],
     )
 
     automata = automata.minimize()
-    dfa_dict = dfa.dfa2dict(automata)
-    start_state = dfa_dict[1]
-    transition_info = dfa_dict[0]
-    # removing sink state
-    del transition_info[2]
-    for state in transition_info.keys():
-        state_transitions = transition_info[state][1]
-
-        for tile in tile_vertex_map.keys():
-            if state_transitions[tile] == 2:
-                # removing edges to the sink state
-                del state_transitions[tile]
+    # exporting in the shape of dfa.dfa2dict, removing the sink state and edges to it
+    transition_info, start_state = automata.toDict(drop_sink=True)
 
     print(start_state)
     print(transition_info)
@@ -0,0 +1,220 @@
+import numpy as np
+
+
+class Propagation:
+    """
+    Class Propagation stores the adjacency matrix of a propagation as a single packed integer.
+    Entry (i, j) of the size x size boolean matrix is bit (i * size + j) of bits, so every row
+    of the matrix is a contiguous block of size bits which can be used directly as a bitmask.
+    """
+    __slots__ = ('size', 'bits', '_rows')
+
+    def __init__(self, bits, size=9):
+        """
+        :param bits: packed integer representation of the adjacency matrix
+        :param size: number of rows (and columns) of the adjacency matrix
+        """
+        self.size = size
+        self.bits = bits
+        self._rows = None
+
+    @classmethod
+    def from_rows(cls, rows, size=9):
+        """
+        Method builds a propagation from a list of row bitmasks, where bit j of rows[i] is entry (i, j)
+        :param rows: list of integers, one bitmask per row
+        :param size: number of rows (and columns) of the adjacency matrix
+        :return: the corresponding Propagation
+        """
+        bits = 0
+        for i, row in enumerate(rows):
+            bits |= row << (i * size)
+        prop = cls(bits, size)
+        prop._rows = tuple(rows)
+        return prop
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """
+        Method builds a propagation from a square 0/1 adjacency matrix
+        :param matrix: square array-like adjacency matrix
+        :return: the corresponding Propagation
+        """
+        matrix = np.asarray(matrix)
+        size = matrix.shape[0]
+        rows = []
+        for i in range(size):
+            row = 0
+            for j in np.flatnonzero(matrix[i]):
+                row |= 1 << int(j)
+            rows.append(row)
+        return cls.from_rows(rows, size)
+
+    def rows(self):
+        """
+        :return: tuple of row bitmasks, where bit j of the i-th row is entry (i, j)
+        """
+        if self._rows is None:
+            mask = (1 << self.size) - 1
+            self._rows = tuple((self.bits >> (i * self.size)) & mask for i in range(self.size))
+        return self._rows
+
+    def key(self):
+        """
+        :return: canonical byte representation of the packed matrix, used to index propagations by hash
+        """
+        return self.bits.to_bytes((self.size * self.size + 7) // 8, 'little')
+
+    def entry(self, i, j):
+        """
+        :return: entry (i, j) of the adjacency matrix, either 0 or 1
+        """
+        return (self.bits >> (i * self.size + j)) & 1
+
+    def has_fixed_point(self):
+        """
+        :return: True if some state is taken to itself, ie the adjacency matrix has a non-zero diagonal entry
+        """
+        diagonal = 0
+        for i, row in enumerate(self.rows()):
+            diagonal |= row & (1 << i)
+        return diagonal != 0
+
+    def transpose(self):
+        """
+        :return: the Propagation whose adjacency matrix is the transpose of this one
+        """
+        rows = [0] * self.size
+        for i, row in enumerate(self.rows()):
+            j = 0
+            while row:
+                if row & 1:
+                    rows[j] |= 1 << i
+                row >>= 1
+                j += 1
+        return Propagation.from_rows(rows, self.size)
+
+    def permute(self, permutation):
+        """
+        :param permutation: list mapping each state i to the state permutation[i]
+        :return: the Propagation with entry (permutation[i], permutation[j]) equal to entry (i, j) of this one
+        """
+        rows = [0] * self.size
+        for i, row in enumerate(self.rows()):
+            j = 0
+            while row:
+                if row & 1:
+                    rows[permutation[i]] |= 1 << permutation[j]
+                row >>= 1
+                j += 1
+        return Propagation.from_rows(rows, self.size)
+
+    def to_matrix(self):
+        """
+        :return: the propagation as a size x size integer adjacency matrix
+        """
+        m = np.zeros((self.size, self.size), dtype=int)
+        for i, row in enumerate(self.rows()):
+            j = 0
+            while row:
+                if row & 1:
+                    m[i][j] = 1
+                row >>= 1
+                j += 1
+        return m
+
+    def __mul__(self, other):
+        """
+        Normalised matrix multiplication self * other over the boolean semiring. Row i of the result is the
+        union of the rows of other selected by the bits set in row i of self.
+        """
+        if self.size != other.size:
+            raise ValueError(f'Cannot multiply propagations of size {self.size} and {other.size}')
+        other_rows = other.rows()
+        rows = []
+        for row in self.rows():
+            result = 0
+            while row:
+                low = row & -row
+                result |= other_rows[low.bit_length() - 1]
+                row ^= low
+            rows.append(result)
+        return Propagation.from_rows(rows, self.size)
+
+    def __eq__(self, other):
+        return isinstance(other, Propagation) and self.size == other.size and self.bits == other.bits
+
+    def __hash__(self):
+        return hash((self.size, self.bits))
+
+    def __repr__(self):
+        return f'Propagation({self.bits:#x}, size={self.size})'
+
+
+class PropagationRegistry:
+    """
+    Class PropagationRegistry interns propagations, assigning each distinct propagation a stable integer id
+    given by the order in which it was first added. Membership and index lookups are answered in constant
+    time through a dictionary keyed on the canonical bytes of each propagation.
+    """
+
+    def __init__(self, props=()):
+        """
+        :param props: propagations to be added to the registry, in order
+        """
+        self.props = []     # maps ids to propagations
+        self._ids = {}      # maps canonical bytes of a propagation to its id
+        for prop in props:
+            self.add(prop)
+
+    def add(self, prop):
+        """
+        Method adds prop to the registry if it has not been encountered before
+        :param prop: Propagation to be added
+        :return: the id of prop and whether it was newly added
+        """
+        key = prop.key()
+        prop_id = self._ids.get(key)
+        if prop_id is not None:
+            return prop_id, False
+        prop_id = len(self.props)
+        self._ids[key] = prop_id
+        self.props.append(prop)
+        return prop_id, True
+
+    def to_array(self):
+        """
+        :return: id-to-propagation array, a uint8 array whose row i holds the canonical bytes of propagation i
+        """
+        size = self.props[0].size if self.props else 9
+        nbytes = (size * size + 7) // 8
+        return np.frombuffer(b''.join(prop.key() for prop in self.props), dtype=np.uint8).reshape(-1, nbytes)
+
+    @classmethod
+    def from_array(cls, array, size=9):
+        """
+        Method builds a registry from an id-to-propagation array as returned by to_array
+        :param array: uint8 array of canonical bytes, one propagation per row
+        :param size: number of rows (and columns) of the adjacency matrices
+        :return: PropagationRegistry with the propagation in row i given id i
+        """
+        return cls(Propagation(int.from_bytes(row.tobytes(), 'little'), size) for row in array)
+
+    def index(self, prop):
+        """
+        :param prop: Propagation to be looked up
+        :return: the id of prop, or -1 if it is not in the registry
+        """
+        return self._ids.get(prop.key(), -1)
+
+    def __contains__(self, prop):
+        return prop.key() in self._ids
+
+    def __getitem__(self, prop_id):
+        return self.props[prop_id]
+
+    def __iter__(self):
+        return iter(self.props)
+
+    def __len__(self):
+        return len(self.props)
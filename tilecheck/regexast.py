@@ -0,0 +1,237 @@
+import itertools
+
+
+class Letter:
+    """
+    Class Letter is a single letter of a regular expression: a tile letter, or one of the markers x (an even
+    number of Vis) and y (the $ symbol)
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class Concat:
+    """
+    Class Concat is the concatenation of its parts, in order
+    """
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = tuple(parts)
+
+    def __repr__(self):
+        if not self.parts:
+            return '()'     # the empty word
+        return ''.join(f'({part!r})' if isinstance(part, Choice) else repr(part) for part in self.parts)
+
+
+class Choice:
+    """
+    Class Choice is the choice (union) of its options
+    """
+    __slots__ = ('options',)
+
+    def __init__(self, options):
+        self.options = tuple(options)
+
+    def __repr__(self):
+        return '+'.join(repr(option) for option in self.options)
+
+
+class Star:
+    """
+    Class Star is the Kleene star of its body. Expansion treats it as a single token, by default the bracketed
+    body followed by *, so that eg (gg)* can be given the marker x as its token
+    """
+    __slots__ = ('body', 'token')
+
+    def __init__(self, body, token=None):
+        self.body = body
+        self.token = f'({body!r})*' if token is None else token
+
+    def __repr__(self):
+        return self.token
+
+
+# the empty word, as an empty concatenation
+EPSILON = Concat(())
+
+
+def concat(*nodes):
+    """
+    :return: the concatenation of nodes, flattening nested concatenations and leaving out the empty word
+    """
+    parts = []
+    for node in nodes:
+        parts.extend(node.parts if isinstance(node, Concat) else (node,))
+    return parts[0] if len(parts) == 1 else Concat(parts)
+
+
+def choice(*nodes):
+    """
+    :return: the choice between nodes, flattening nested choices and dropping repeated options
+    """
+    options = {}
+    for node in nodes:
+        for option in node.options if isinstance(node, Choice) else (node,):
+            options.setdefault(repr(option), option)
+    options = list(options.values())
+    return options[0] if len(options) == 1 else Choice(options)
+
+
+def star(node):
+    """
+    :return: the Kleene star of node, which is the empty word if node is
+    """
+    return EPSILON if node is EPSILON or isinstance(node, Concat) and not node.parts else Star(node)
+
+
+def size(node, memo=None):
+    """
+    :param node: root of a regular expression
+    :param memo: dictionary to memoize sizes in, for expressions sharing subexpressions. It maps the id of each
+                 node to the node and its size, keeping the node alive so that its id is not reused
+    :return: number of letters in the expression
+    """
+    if memo is not None and id(node) in memo:
+        return memo[id(node)][1]
+    if isinstance(node, Letter):
+        letters = 1
+    elif isinstance(node, Star):
+        letters = size(node.body, memo)
+    else:
+        letters = sum(size(child, memo) for child in (node.parts if isinstance(node, Concat) else node.options))
+    if memo is not None:
+        memo[id(node)] = (node, letters)
+    return letters
+
+
+def parseRegex(regex):
+    """
+    Method parseRegex parses a regular expression written with single character letters, juxtaposition for
+    concatenation, + for choice and brackets for grouping, as in regexformat (eg "(lx+pxg)(j+i)"). The Kleene
+    star is not supported; repetition is expressed by the marker x instead.
+
+    :param regex: String regular expression
+    :return: the root node of the expression, a Letter, Concat or Choice
+    """
+    position = 0
+
+    def choice():
+        nonlocal position
+        options = [concat()]
+        while position < len(regex) and regex[position] == '+':
+            position += 1
+            options.append(concat())
+        return options[0] if len(options) == 1 else Choice(options)
+
+    def concat():
+        nonlocal position
+        parts = []
+        while position < len(regex) and regex[position] not in '+)':
+            if regex[position] == '(':
+                position += 1
+                parts.append(choice())
+                if position >= len(regex) or regex[position] != ')':
+                    raise ValueError(f'Unbalanced bracket at position {position} of regex')
+                position += 1
+            elif regex[position].isalpha():
+                parts.append(Letter(regex[position]))
+                position += 1
+            else:
+                raise ValueError(f'Unexpected {regex[position]!r} at position {position} of regex')
+        if not parts:
+            raise ValueError(f'Empty term at position {position} of regex')
+        return parts[0] if len(parts) == 1 else Concat(parts)
+
+    node = choice()
+    if position != len(regex):
+        raise ValueError(f'Unbalanced bracket at position {position} of regex')
+    return node
+
+
+def expandNode(node):
+    """
+    :param node: Letter, Concat, Choice or Star
+    :return: list of the distinct product terms of node, each a tuple of letters, in order of first appearance
+    """
+    return list(dict.fromkeys(_iterNode(node)))
+
+
+def _iterNode(node):
+    # terms of node, possibly repeated
+    if isinstance(node, Letter):
+        yield (node.name,)
+    elif isinstance(node, Star):
+        yield (node.token,)
+    elif isinstance(node, Choice):
+        for option in node.options:
+            yield from _iterNode(option)
+    elif not node.parts:
+        yield ()
+    else:
+        # every part but the first is expanded once, and the first part is streamed
+        rest = [expandNode(part) for part in node.parts[1:]]
+        for head in _iterNode(node.parts[0]):
+            for tail in itertools.product(*rest):
+                yield head + tuple(letter for term in tail for letter in term)
+
+
+def iterTerms(node):
+    """
+    Method iterTerms expands a regular expression into a sum of product terms, distributing concatenation over
+    choice without reordering letters (as the non-commutative sympy expansion does). Terms are streamed as they
+    are generated, and repeated terms are dropped by hashing.
+
+    :param node: root of a parsed regular expression, as returned by parseRegex
+    :return: generator of distinct tuples of letters
+    """
+    seen = set()
+    for term in _iterNode(node):
+        if term not in seen:
+            seen.add(term)
+            yield term
+
+
+def termToString(term, drop=('y',)):
+    """
+    Method writes a product term the way sympy prints it, eg ('g', 'g', 'x') becomes "g**2*x"
+    :param term: tuple of letters
+    :param drop: letters left out of the string, after runs of equal letters have been grouped
+    :return: String product term
+    """
+    factors = []
+    for letter, run in itertools.groupby(term):
+        if letter in drop:
+            continue
+        power = len(list(run))
+        factors.append(letter if power == 1 else f'{letter}**{power}')
+    return '*'.join(factors)
+
+
+def sympyTerms(regex, letters):
+    """
+    Method expands regex with sympy over non-commutative symbols, the original method of regexformat. It is much
+    slower than iterTerms and is kept to cross-check it.
+
+    :param regex: String regular expression, as accepted by parseRegex
+    :param letters: iterable of the letters which may appear in regex
+    :return: set of product terms, written as by termToString
+    """
+    from sympy import Symbol
+    from sympy.parsing.sympy_parser import parse_expr
+    from regexformat import regexToMult
+
+    local_dict = {letter: Symbol(letter, commutative=False) for letter in set(letters) | {'x', 'y'}}
+    expr = parse_expr(regexToMult(regex, local_dict), local_dict=local_dict).expand()
+    terms = set()
+    for term in str(expr).split('+'):
+        term = term.replace(' ', '')
+        # dropping y, with the * joining it to the previous factor
+        terms.add(term.replace('*y', '').replace('y*', '').replace('y', ''))
+    return terms
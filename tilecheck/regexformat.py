@@ -1,4 +1,5 @@
-from sympy import *
+import sys
+from regexast import parseRegex, iterTerms, termToString, sympyTerms
 
 
 def regexToMult(regex, tile_alphabet_map):
@@ -43,6 +44,149 @@ def listPairsToTiles(l, tile_alphabet_map):
     return result
 
 
+def _find(term, pattern):
+    """
+    :return: index of the first occurrence of the tuple pattern in the tuple term, or -1
+    """
+    for i in range(len(term) - len(pattern) + 1):
+        if term[i:i + len(pattern)] == pattern:
+            return i
+    return -1
+
+
+def removeAbsorbedByX(terms):
+    """
+    Pass removing every term e such that e*x is also a term, since the language of e is contained in that of e*x
+    :param terms: set of terms, each a tuple of letters
+    :return: the simplified set of terms
+    """
+    return {e for e in terms if e + ('x',) not in terms}
+
+
+def removeXGG(terms):
+    """
+    Pass removing every term s1*x*g**2*s2 such that s1*x*s2 is also a term, which contains its language
+    :param terms: set of terms, each a tuple of letters
+    :return: the simplified set of terms
+    """
+    kept = set()
+    for e in terms:
+        index = _find(e, ('x', 'g', 'g'))
+        if index == -1 or e[:index + 1] + e[index + 3:] not in terms:
+            kept.add(e)
+    return kept
+
+
+def removeLeadingG(terms):
+    """
+    Pass removing every term starting with g which contains some tile letter other than g
+    :param terms: set of terms, each a tuple of letters
+    :return: the simplified set of terms
+    """
+    return {e for e in terms if not (e[:1] == ('g',) and any(letter not in 'gxy' for letter in e))}
+
+
+def mergeGXG(terms):
+    """
+    Pass replacing pairs of terms s1*g*x*g*s2 and s1*s2 by the single term s1*x*s2, which describes both
+    :param terms: set of terms, each a tuple of letters
+    :return: the simplified set of terms
+    """
+    removed, added = set(), set()
+    for e in terms:
+        index = _find(e, ('g', 'x', 'g'))
+        if index != -1:
+            match = e[:index] + e[index + 3:]
+            if match in terms:
+                removed.update((e, match))
+                added.add(e[:index] + ('x',) + e[index + 3:])
+    return (terms - removed) | added
+
+
+def swapXG(terms):
+    """
+    Pass rewriting x*g as g*x in every term, until no x is followed by g
+    :param terms: set of terms, each a tuple of letters
+    :return: the rewritten set of terms
+    """
+    swapped = set()
+    for e in terms:
+        index = _find(e, ('x', 'g'))
+        while index != -1:
+            e = e[:index] + ('g', 'x') + e[index + 2:]
+            index = _find(e, ('x', 'g'))
+        swapped.add(e)
+    return swapped
+
+
+def simplifyTerms(terms, passes):
+    """
+    Method simplifyTerms runs each pass in turn, repeating a pass until it no longer changes the terms
+    :param terms: iterable of terms, each a tuple of letters
+    :param passes: list of functions taking and returning a set of terms
+    :return: the simplified set of terms, and a list of (pass name, number of terms removed) pairs
+    """
+    terms = set(terms)
+    report = []
+    for simplification in passes:
+        before = len(terms)
+        while True:
+            simplified = simplification(terms)
+            if simplified == terms:
+                break
+            terms = simplified
+        report.append((simplification.__name__, before - len(terms)))
+    return terms, report
+
+
+# simplification passes, in the order they are run. Each relies on g being the Vi tile and x an even amount of
+# Vis, so characterize skips them all when no tile has the propagation of Vi
+SIMPLIFICATION_PASSES = [
+    removeAbsorbedByX,      # language generated by e is contained in language generated by e*x
+    removeXGG,              # language s1*x*g**2*s2 is contained in language s1*x*s2
+    removeLeadingG,
+    mergeGXG,               # s1 g*x*g s2 and s1 s2 can be described using s1 x s2
+    swapXG,                 # switching x*g to g*x
+]
+
+
+def simplifyRegex(node, passes=None):
+    """
+    Method expands a regular expression into its product terms, leaving out y (the $ symbol), and simplifies them
+    :param node: root of a regular expression, as returned by parseRegex or characterize.eliminationRegex
+    :param passes: list of simplification passes, SIMPLIFICATION_PASSES by default
+    :return: the simplified set of terms, and the report of simplifyTerms
+    """
+    terms = {tuple(letter for letter in term if letter != 'y') for term in iterTerms(node)}
+    return simplifyTerms(terms, SIMPLIFICATION_PASSES if passes is None else passes)
+
+
+def matchCases(terms):
+    """
+    Method matches terms with the cases defined in the characterization
+    :param terms: iterable of terms, each a tuple of letters
+    :return: list of letters or pairs of letters matching each of cases i to vi, and list of the remaining terms
+    """
+    cases = [[] for _ in range(6)]
+    remaining = []
+    for e in terms:
+        if len(e) == 2 and e[1] == 'x':     # t * x
+            cases[0].append(e[0])
+        elif len(e) == 5 and e[1:3] == ('g', 'x') and e[4] == 'x':     # t1 * g * x * t2 * x
+            cases[1].append((e[0], e[3]))
+        elif len(e) == 4 and e[2:] == ('g', 'x'):      # t1 * t2 * g * x
+            cases[2].append((e[0], e[1]))
+        elif len(e) == 3 and e[1:] == ('g', 'x'):      # t * g * x
+            cases[3].append(e[0])
+        elif len(e) == 4 and e[1] == 'x' and e[3] == 'x':     # t1 * x * t2 * x
+            cases[4].append((e[0], e[2]))
+        elif len(e) == 3 and e[2] == 'x':      # t1 * t2 * x
+            cases[5].append((e[0], e[1]))
+        else:
+            remaining.append(e)
+    return cases, remaining
+
+
 if __name__ == "__main__":
     # regex containing the expression for 4-chrom cyclizations, using letters for tiles
     regex = "(lx+pxg)(j+i)+qxgr+((q+k+gx(e+gk))x+s+t+m+o+kxn+rq+exd+gx(a+h+c+b+rg+pxg(" \
@@ -63,131 +207,25 @@ if __name__ == "__main__":
                          'o': "DBL",
                          'p': "DDL", 'q': "AIBL", 'r': "BIAL", 's': "HL", 't': "DAdL"}
 
-    # x is an even amount of Vis, y is $ symbol
-    a, b, c, d, e, f, g, h, i, j, k, l, m, n, o, p, q, r, s, t, x, y = symbols("a, b, c, d, e, f, g, h, i, j, k, l, m, n, "
-                                                                             "o, p, q, r, s, t, x, y", commutative=False)
-    expr = (l*x+p*x*g)*(j+i)+q*x*g*r+((q+k+g*x*(e+g*k))*x+s+t+m+o+k*x*n+r*q+e*x*d+g*x*(a+h+c+b+r*g+p*x*g*(j+i)+n*e+(d+n*g)*x*(k+g*e)+e*x*n+k*x*d+g*(s+q+t+m+o+k*x*n+r*q+e*x*d)+(j+i)*l)+(j+i+g*x*g*(j+i))*(p+g*x*g*p)+r)*g+g*x*(r+n+(d+n*g)*x*g+(j+i)*(g*x*(g+g*(p+g)+y)+g+p)+j+i+s+q+t+m+o+r*q+e*x*d+k*x*(n+y+g*g)+g*(a+h+c+b+k*x*d+r*g+p*x*g*(j+i)+e*x*n+n*(e+g)+(d+n*g)*x*(k+g*e)+j+i+g+d+(d+n*g+e)*x*(y+g*g)+e)+y+k)+e+e*x*(y+g*g+n)+d+n*(g+e)+(d+n*g)*x*(y+g*(g+e)+k)+g+(j+i+g*x*g*(j+i))*(g*x*(g+y+g*g)+g+l)+j+i+a+h+c+b+k*x*d+(a+h+c+b+k*x*d+(r+s+t+m+o+k*x*n+r*q+e*x*d+g*x*(a+h+c+b+r*g+p*x*g*(j+i)+n*e+(d+n*g)*x*(k+g*e)+e*x*n+k*x*d+g*(s+q+t+m+o+k*x*n+r*q+e*x*d)+(j+i)*l)+(j+i+g*x*g*(j+i))*(p+g*x*g*p))*g+p*x*g*(j+i)+e*x*n+n*e+(d+n*g)*x*(k+g*e)+g*x*(s+q+t+m+o+r*q+e*x*d+k*x*n+g*(a+h+c+b+k*x*d+r*g+p*x*g*(j+i)+e*x*n+n*e+(d+n*g)*x*(k+g*e))+(j+i)*(p+g*x*g*p))+(j+i+g*x*g*(j+i))*l)*x*(y+g*g)
-    expr = expr.expand()
-
-    strExpr = str(expr)
-    # storing each multiplicative term in expressions
-    expressions = []
-    buffer = ""
-    for i, letter in enumerate(strExpr):
-        if letter == '+':
-            expressions += [buffer]
-            buffer = ""
-        elif letter != ' ' and (not (letter == '*' and strExpr[i+1] == 'y')) and not letter == 'y':
-            buffer += letter
-    expressions += [buffer]
-    expressions = list(set(expressions))  # removing any duplicates
-    print("initial: ")
-    print(expressions)
+    # expanding the regex into a sum of product terms, leaving out y (the $ symbol); x is an even amount of Vis
+    node = parseRegex(regex)
+    if '--sympy' in sys.argv:
+        # cross-checking against the (much slower) sympy expansion
+        expressions = {termToString(term) for term in iterTerms(node)}
+        if expressions != sympyTerms(regex, tile_alphabet_map.keys()):
+            raise AssertionError("Expansion of regex differs from sympy's")
+
+    expressions, report = simplifyRegex(node)
+    for name, removed in report:
+        print(name, "removed", removed)
     print(len(expressions))
 
-    # Language generated by e is contained in language generated by e*x
-    toRemove = []
-    for e in expressions:
-        match = e+"*x"
-        for f in expressions:
-            if f == match:
-                toRemove += [e]
-
-    for e in toRemove:
-        expressions.remove(e)
-    print(len(expressions))
-
-    # language s1*x*g**2*s2 is contained in language s1*x*s2
-    toRemove = []
-    for e in expressions:
-        index = e.find("x*g**2")
-        if index != -1:
-            match = e[:index] + "x" + e[index+6:]
-            for f in expressions:
-                if f == match:
-                    toRemove += [e]
-
-    for e in toRemove:
-        expressions.remove(e)
-    print(len(expressions))
-    print(expressions)
-
-    # language s1*x*g**2*s2 is contained in language s1*x*s2
-    toRemove = []
-    for e in expressions:
-        found = false
-        for letter in tile_alphabet_map.keys():
-            if letter in e and letter != 'g':
-                found = true
-
-        if found and e[0] == 'g':
-            toRemove += [e]
-    print(toRemove)
-    for e in toRemove:
-        expressions.remove(e)
-    print(len(expressions))
-
-    # s1 g*x*g s2 and s1 s2 can be described using s1 x s2
-    toRemove = []
-    toAdd = []
-    for e in expressions:
-        index = e.find("g*x*g")
-        if index != -1:
-            match = e[:index-1] + e[index + 5:]
-            print(e)
-            print(match)
-            for f in expressions:
-                if f == match:
-                    toRemove += [e]
-                    toRemove += [f]
-                    toAdd += [e[:index] + "x" + e[index + 5:]]
-    for e in toRemove:
-        expressions.remove(e)
-    expressions += toAdd
-    print(len(expressions))
-
-    # switching x*g to g*x
-    toRemove = []
-    toAdd = []
-    for i, e in enumerate(expressions):
-        index = e.find("x*g")
-        if index != -1:
-            expressions[i] = e[:index] + "g*x" + e[index + 3:]
-
-    expressions = list(set(expressions))
-    print(len(expressions))
-
-    expressions.sort()
-    print(expressions)
+    expressions = sorted(expressions, key=termToString)
+    print([termToString(e) for e in expressions])
 
     # We match expression based on the cases defined in the characterization
-    remaining = []
-    matchCaseI = []
-    matchCaseII = []
-    matchCaseIII = []
-    matchCaseIV = []
-    matchCaseV = []
-    matchCaseVI = []
-    for e in expressions:
-        if e[2:] == "x":        # t * x
-            matchCaseI += [e[0]]
-        # t1 * g * x * t2 * x
-        elif len(e) == 9 and e[2:5] == "g*x" and e[8] == 'x':
-            matchCaseII += [(e[0], e[6])]
-        # t1 * t2 * g * x
-        elif len(e) == 7 and e[4:] == "g*x":
-            matchCaseIII += [(e[0], e[2])]
-        # t * g * x
-        elif len(e) == 5 and e[2:] == "g*x":
-            matchCaseIV += [e[0]]
-        # t1 * x * t2 * x
-        elif len(e) == 7 and e[2] == 'x' and e[6:] == "x":
-            matchCaseV += [(e[0], e[4])]
-        # t1 * t2 * x
-        elif len(e) == 5 and e[4:] == "x":
-            matchCaseVI += [(e[0], e[2])]
-        else:
-            remaining += [e]
+    (matchCaseI, matchCaseII, matchCaseIII, matchCaseIV, matchCaseV, matchCaseVI), remaining = \
+        matchCases(expressions)
 
     print("Case i")
     print(listLettersToTiles(matchCaseI, tile_alphabet_map))
@@ -202,6 +240,6 @@ if __name__ == "__main__":
     print("Case vi")
     print(listPairsToTiles(matchCaseVI, tile_alphabet_map))
     print("Remaining")
-    print(remaining)
+    print([termToString(e) for e in remaining])
 
 
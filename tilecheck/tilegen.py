@@ -0,0 +1,120 @@
+import json
+import random
+
+
+def randomTile(rng, vertices, sparsity=0.3, width=2, wall_edges=0.2):
+    """
+    Method randomTile generates a random connected planar tile. The outer face is a cycle through the left wall, the
+    bottom, the right wall (reversed) and the top, which is triangulated by clipping random ears. The remaining
+    vertices are placed inside random triangles and joined to their corners. A random spanning tree is then kept,
+    which only uses edges joining two vertices of the same wall where they are needed to keep the graph connected.
+    Of the other edges, inner edges are deleted at random, as are edges joining two vertices of the same wall. Every
+    step keeps the graph planar, and the spanning tree keeps it connected.
+
+    :param rng: random.Random used for all choices
+    :param vertices: number of vertices, at least 2 * width + 2
+    :param sparsity: probability that an inner edge outside the spanning tree is deleted
+    :param width: number of vertices w on each wall, labelled 1, ..., w (left) and w + 1, ..., 2w (right)
+    :param wall_edges: probability that an edge within a wall, outside the spanning tree, is kept. With 0.2, about a
+                       third of tiles with walls of width 2 have a wall edge, as in tilings_2.json
+    :return: adjacency list in the format of tilings_2.json, mapping vertex strings to lists of neighbours
+    """
+    if vertices < 2 * width + 2:
+        raise ValueError(f'A tile with walls of width {width} needs at least {2 * width + 2} vertices')
+    left = list(range(1, width + 1))
+    right = list(range(width + 1, 2 * width + 1))
+    extra = list(range(2 * width + 1, vertices + 1))
+    rng.shuffle(extra)
+
+    # splitting the first vertices after the walls between the bottom and top of the outer face
+    outer_count = rng.randint(2, len(extra))
+    bottom_count = rng.randint(1, outer_count - 1)
+    bottom, top, inner = extra[:bottom_count], extra[bottom_count:outer_count], extra[outer_count:]
+    polygon = left + bottom + right[::-1] + top
+
+    edges = set()
+    boundary = set()
+    for u, v in zip(polygon, polygon[1:] + polygon[:1]):
+        boundary.add(frozenset((u, v)))
+    edges |= boundary
+
+    # ear clipping the outer polygon
+    triangles = []
+    polygon = polygon[:]
+    while len(polygon) > 3:
+        i = rng.randrange(len(polygon))
+        a, b, c = polygon[i - 1], polygon[i], polygon[(i + 1) % len(polygon)]
+        edges.add(frozenset((a, c)))
+        triangles.append((a, b, c))
+        del polygon[i]
+    triangles.append(tuple(polygon))
+
+    # placing inner vertices in random triangles
+    for v in inner:
+        a, b, c = triangles.pop(rng.randrange(len(triangles)))
+        edges |= {frozenset((v, a)), frozenset((v, b)), frozenset((v, c))}
+        triangles += [(a, b, v), (b, c, v), (c, a, v)]
+
+    walls = [set(left), set(right)]
+    edges = sorted(tuple(sorted(edge)) for edge in edges)
+    wall_edge = [any(u in wall and v in wall for wall in walls) for u, v in edges]
+
+    # random spanning tree by Kruskal's algorithm over the edges in random order, with edges within a wall last so
+    # that they are only used to reach wall vertices with no other neighbours
+    roots = list(range(vertices + 1))
+
+    def find(v):
+        while roots[v] != v:
+            roots[v] = roots[roots[v]]
+            v = roots[v]
+        return v
+
+    tree = set()
+    inner_order = [i for i in range(len(edges)) if not wall_edge[i]]
+    wall_order = [i for i in range(len(edges)) if wall_edge[i]]
+    rng.shuffle(inner_order)
+    rng.shuffle(wall_order)
+    for i in inner_order + wall_order:
+        u, v = (find(w) for w in edges[i])
+        if u != v:
+            roots[u] = v
+            tree.add(i)
+
+    adjacency = {v: [] for v in range(1, vertices + 1)}
+    for i, (u, v) in enumerate(edges):
+        if i in tree:
+            pass
+        elif wall_edge[i]:
+            if rng.random() >= wall_edges:
+                continue
+        elif frozenset((u, v)) not in boundary and rng.random() < sparsity:
+            continue
+        adjacency[u].append(v)
+        adjacency[v].append(u)
+    return {str(v): neighbours for v, neighbours in adjacency.items()}
+
+
+def randomTiling(count, vertices=(8, 12), sparsity=0.3, width=2, seed=0, wall_edges=0.2):
+    """
+    Method randomTiling generates a reproducible library of random planar tiles
+    :param count: number of tiles
+    :param vertices: (smallest, largest) number of vertices of a tile
+    :param sparsity: probability that an inner edge is deleted, as in randomTile
+    :param width: number of vertices on each wall
+    :param seed: seed of the random generator
+    :param wall_edges: probability that an edge within a wall is kept, as in randomTile
+    :return: dictionary mapping tile names to adjacency lists, in the format of tilings_2.json
+    """
+    rng = random.Random(seed)
+    digits = len(str(count))
+    return {f'T{i:0{digits}d}': randomTile(rng, rng.randint(*vertices), sparsity, width, wall_edges)
+            for i in range(count)}
+
+
+def writeTiling(tiling, path):
+    """
+    :param tiling: dictionary mapping tile names to adjacency lists
+    :param path: path of the json file to be written
+    """
+    with open(path, 'w') as f:
+        json.dump(tiling, f)
@@ -0,0 +1,129 @@
+import json
+
+_decoder = json.JSONDecoder()
+
+
+def iterJsonLines(f):
+    """
+    Method iterJsonLines reads tiles stored in JSON Lines format, one tile per line. Each line is either an
+    object {"name": tile, "adjacency": {...}} or a single entry object {tile: {...}}.
+
+    :param f: file object opened in text mode
+    :return: generator of (tile, adjacency) pairs
+    """
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if 'name' in record and 'adjacency' in record:
+            yield record['name'], record['adjacency']
+        elif len(record) == 1:
+            yield next(iter(record.items()))
+        else:
+            raise ValueError(f'Line {line_number} does not describe a single tile')
+
+
+def iterJsonObject(f, chunk_size=1 << 16):
+    """
+    Method iterJsonObject reads tiles from a json file holding a single object which maps tile names to their
+    adjacency information, as in tilings_2.json. The object is decoded one entry at a time from a buffer which
+    is refilled as needed, so the file is never held in memory as a whole.
+
+    :param f: file object opened in text mode
+    :param chunk_size: number of characters read at a time
+    :return: generator of (tile, adjacency) pairs
+    """
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        # discarding the consumed part of the buffer and reading the next chunk
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        return not eof
+
+    def skip():
+        # moving past whitespace
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    def expect(characters):
+        # consuming exactly one of the given separator characters after any whitespace, and returning it
+        nonlocal position
+        skip()
+        if position >= len(buffer) or buffer[position] not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {' '.join(characters)}", buffer, position)
+        position += 1
+        return buffer[position - 1]
+
+    def decode():
+        # decoding the next json value, reading more of the file while the value is incomplete
+        nonlocal position
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+                # a value ending the buffer might continue in the next chunk, unless it is an object or string
+                if end < len(buffer) or eof or buffer[end - 1] in '}"':
+                    position = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    skip()
+    if position >= len(buffer) or buffer[position] != '{':
+        raise ValueError('Expected a json object mapping tiles to adjacency information')
+    position += 1
+
+    # an empty object has no entries, and otherwise each entry but the last is followed by a comma
+    skip()
+    separator = expect('}') if position < len(buffer) and buffer[position] == '}' else ','
+    while separator == ',':
+        skip()
+        tile = decode()
+        if not isinstance(tile, str):
+            raise json.JSONDecodeError('Expecting a tile name as key', buffer, position)
+        expect(':')
+        skip()
+        yield tile, decode()
+        separator = expect(',}')
+
+    skip()
+    if position < len(buffer):
+        raise json.JSONDecodeError('Extra data', buffer, position)
+
+
+def iterTiles(path):
+    """
+    Method iterTiles streams the tiles of a tiling file, choosing the reader by file extension: '.jsonl' files
+    are read with iterJsonLines and any other file with iterJsonObject.
+
+    :param path: path of the tiling file
+    :return: generator of (tile, adjacency) pairs, in file order
+    """
+    with open(path) as f:
+        if path.endswith('.jsonl'):
+            yield from iterJsonLines(f)
+        else:
+            yield from iterJsonObject(f)
+
+
+def writeJsonLines(tiles, path):
+    """
+    Method writeJsonLines stores tiles in JSON Lines format, one {"name": ..., "adjacency": ...} object per line
+    :param tiles: iterable of (tile, adjacency) pairs, eg iterTiles(path) or a dictionary's items()
+    :param path: path of the file to be written
+    """
+    with open(path, 'w') as f:
+        for tile, adjacency in tiles:
+            f.write(json.dumps({'name': tile, 'adjacency': adjacency}) + '\n')
@@ -0,0 +1,152 @@
+import numpy as np
+from closure import reverseProductIndex
+
+# parent pointer of propagations which have not been reached, and of the generators themselves
+UNREACHED = -2
+ROOT = -1
+
+
+def _generators(tile_prop_ids):
+    """
+    :param tile_prop_ids: dictionary mapping each tile to the id of its propagation in the closure
+    :return: list of tiles, and arrays of the distinct generator ids with the index of the first tile of each
+    """
+    tiles = list(tile_prop_ids)
+    first = {}
+    for i, tile in enumerate(tiles):
+        first.setdefault(tile_prop_ids[tile], i)
+    return tiles, np.array(list(first), dtype=np.int64), np.array(list(first.values()), dtype=np.int32)
+
+
+def _firstOccurrences(ids):
+    """
+    :return: positions of the first occurrence of each distinct value of ids, in order of position
+    """
+    _, first = np.unique(ids, return_index=True)
+    return np.sort(first)
+
+
+def _expand(product_table, frontier, gen_ids, gen_letters, parent, letter, depth):
+    """
+    Method multiplies every propagation of frontier on the right by every generator, recording parent pointers
+    of the products which have not been reached yet
+    :return: array of the newly reached ids, in order of discovery
+    """
+    products = np.asarray(product_table)[np.ix_(frontier, gen_ids)].ravel()
+    candidates = np.flatnonzero(parent[products] == UNREACHED)
+    candidates = candidates[_firstOccurrences(products[candidates])]
+    reached = products[candidates]
+    parent[reached] = frontier[candidates // len(gen_ids)]
+    letter[reached] = gen_letters[candidates % len(gen_ids)]
+    depth[reached] = depth[parent[reached]] + 1
+    return reached
+
+
+def shortestWitnesses(product_table, tile_prop_ids):
+    """
+    Method shortestWitnesses runs a breadth first search over the Cayley graph of the closure, from the tile
+    propagations along right multiplication by tile propagations. The propagation with id p is then the product
+    of the tiles of witnessWord(p, ...), and no shorter sequence of tiles gives it.
+
+    :param product_table: product table of the closure, as returned by getPropagationClosure
+    :param tile_prop_ids: dictionary mapping each tile to the id of its propagation in the closure
+    :return: list of tiles, and int32 arrays parent, letter, depth over propagation ids: parent[p] is the id of
+             the propagation one tile shorter (ROOT for tile propagations, UNREACHED if p is not a product of
+             tiles), letter[p] is the index in tiles of the last tile and depth[p] is the length of the word
+    """
+    tiles, gen_ids, gen_letters = _generators(tile_prop_ids)
+    n = product_table.shape[0]
+    parent = np.full(n, UNREACHED, dtype=np.int32)
+    letter = np.full(n, -1, dtype=np.int32)
+    depth = np.zeros(n, dtype=np.int32)
+    parent[gen_ids] = ROOT
+    letter[gen_ids] = gen_letters
+    depth[gen_ids] = 1
+
+    frontier = gen_ids
+    while len(frontier):
+        frontier = _expand(product_table, frontier, gen_ids, gen_letters, parent, letter, depth)
+    return tiles, parent, letter, depth
+
+
+def witnessWord(prop_id, tiles, parent, letter):
+    """
+    :param prop_id: id of a propagation
+    :param tiles, parent, letter: as returned by shortestWitnesses
+    :return: list of tile names whose product is the propagation, or None if it is not a product of tiles
+    """
+    if parent[prop_id] == UNREACHED:
+        return None
+    word = []
+    while prop_id != ROOT:
+        word.append(tiles[letter[prop_id]])
+        prop_id = parent[prop_id]
+    return word[::-1]
+
+
+def witnessWords(product_table, tile_prop_ids, prop_ids=None):
+    """
+    :param product_table: product table of the closure
+    :param tile_prop_ids: dictionary mapping each tile to the id of its propagation in the closure
+    :param prop_ids: ids of the propagations wanted, all propagations by default
+    :return: dictionary mapping each propagation id to a shortest list of tile names with that product
+    """
+    tiles, parent, letter, _ = shortestWitnesses(product_table, tile_prop_ids)
+    prop_ids = range(product_table.shape[0]) if prop_ids is None else prop_ids
+    return {int(p): witnessWord(p, tiles, parent, letter) for p in prop_ids}
+
+
+def bidirectionalWitness(product_table, tile_prop_ids, target):
+    """
+    Method bidirectionalWitness finds a shortest list of tiles whose product is the propagation with id target.
+    Whole layers are grown alternately forwards from the tile propagations and backwards from target, over a
+    reverse index of the product table, always growing the smaller frontier, until the two searches meet.
+
+    :param product_table: product table of the closure
+    :param tile_prop_ids: dictionary mapping each tile to the id of its propagation in the closure
+    :param target: id of the propagation wanted
+    :return: list of tile names, or None if target is not a product of tiles
+    """
+    tiles, gen_ids, gen_letters = _generators(tile_prop_ids)
+    n = product_table.shape[0]
+    pairs, offsets, products = reverseProductIndex(product_table, gen_ids)
+
+    parent = np.full(n, UNREACHED, dtype=np.int32)
+    letter = np.full(n, -1, dtype=np.int32)
+    depth = np.zeros(n, dtype=np.int32)
+    parent[gen_ids] = ROOT
+    letter[gen_ids] = gen_letters
+    depth[gen_ids] = 1
+
+    # successor pointers towards target: propagation s times the tile of next_letter[s] gives next_id[s]
+    next_id = np.full(n, UNREACHED, dtype=np.int32)
+    next_letter = np.full(n, -1, dtype=np.int32)
+    remaining = np.zeros(n, dtype=np.int32)
+    next_id[target] = ROOT
+
+    forward, backward = gen_ids, np.array([target], dtype=np.int64)
+    met = np.array([target]) if parent[target] != UNREACHED else np.zeros(0, dtype=np.int64)
+    while not len(met) and len(forward) and len(backward):
+        if len(forward) <= len(backward):
+            forward = _expand(product_table, forward, gen_ids, gen_letters, parent, letter, depth)
+            met = forward[next_id[forward] != UNREACHED]
+        else:
+            found = np.concatenate([pairs[offsets[t]:offsets[t + 1]] for t in backward])
+            sources = found // len(gen_ids)
+            keep = np.flatnonzero(next_id[sources] == UNREACHED)
+            keep = keep[_firstOccurrences(sources[keep])]
+            backward = sources[keep]
+            next_id[backward] = products[found[keep]]
+            next_letter[backward] = gen_letters[found[keep] % len(gen_ids)]
+            remaining[backward] = remaining[next_id[backward]] + 1
+            met = backward[parent[backward] != UNREACHED]
+
+    if not len(met):
+        return None
+    # the shortest word through any meeting propagation
+    middle = int(met[np.argmin(depth[met] + remaining[met])])
+    word = witnessWord(middle, tiles, parent, letter)
+    while next_id[middle] != ROOT:
+        word.append(tiles[next_letter[middle]])
+        middle = next_id[middle]
+    return word